@@ -0,0 +1,344 @@
+"""
+Lightweight inference for trained PPO agents.
+
+NumpyPolicy pulls the actor network out of a stable-baselines3 .zip once
+and runs it as a few NumPy matrix products, without the SB3 stack or
+torch at inference time (torch is only needed to read the .zip; exported
+.npz files need nothing but NumPy). BatchingServer gathers requests from
+many callers into micro-batches, capped by max_batch_size and
+max_wait_ms, so concurrent games share one forward pass. serve() exposes
+it on a local socket:
+
+    python -m agents.inference --model soccer_stars_ppo.zip --clients 8 --seconds 5
+
+runs the server with 8 local client processes and reports requests/sec,
+latency percentiles and the mean batch size.
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+
+import numpy as np
+
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 2.0
+DEFAULT_SOCKET = '/tmp/soccerstars_inference.sock'
+
+ACTIVATIONS = {
+    'Tanh': np.tanh,
+    'ReLU': lambda x: np.maximum(x, 0),
+    'Identity': lambda x: x,
+}
+
+
+def _parse_array(text, dtype=np.float32):
+    return np.array(text.strip('[]').split(), dtype=dtype)
+
+
+class NumpyPolicy:
+    """
+    The actor half of an SB3 ActorCriticPolicy as plain NumPy.
+
+    layers are (weight, bias) pairs with the activation between them, head
+    the action_net. Box actions come out as the Gaussian mean, clipped to
+    the space like SB3's predict; (Multi)Discrete actions as the argmax per
+    dimension. With deterministic=False actions are sampled, as SB3 does.
+    """
+
+    def __init__(self, layers, head, activation='Tanh', action_low=None, action_high=None, nvec=None, log_std=None):
+        self.layers = [(np.asarray(w, np.float32), np.asarray(b, np.float32)) for w, b in layers]
+        self.head = tuple(np.asarray(a, np.float32) for a in head)
+        self.activation = activation
+        self.action_low = None if action_low is None else np.asarray(action_low, np.float32)
+        self.action_high = None if action_high is None else np.asarray(action_high, np.float32)
+        self.nvec = None if nvec is None else np.asarray(nvec, np.int64)
+        self.log_std = None if log_std is None else np.asarray(log_std, np.float32)
+        self.obs_dim = self.layers[0][0].shape[1] if self.layers else self.head[0].shape[1]
+        self.action_dim = len(self.nvec) if self.nvec is not None else self.head[0].shape[0]
+        self._rng = np.random.default_rng()
+
+    @classmethod
+    def from_zip(cls, path):
+        """Read the actor weights and action space of a saved SB3 PPO model."""
+        import torch  # Only needed to read policy.pth
+
+        if os.path.getsize(path) == 0:
+            raise ValueError(f"{path} is empty; train and save a model first")
+        with zipfile.ZipFile(path) as archive:
+            data = json.loads(archive.read('data'))
+            state = torch.load(io.BytesIO(archive.read('policy.pth')), map_location='cpu')
+        state = {key: value.numpy() for key, value in state.items()}
+
+        layers, k = [], 0
+        while f'mlp_extractor.policy_net.{k}.weight' in state:
+            layers.append((state[f'mlp_extractor.policy_net.{k}.weight'], state[f'mlp_extractor.policy_net.{k}.bias']))
+            k += 2  # Linear layers sit at even indices, activations in between
+
+        activation = 'Tanh'
+        activation_fn = data.get('policy_kwargs', {}).get('activation_fn')
+        if activation_fn:
+            activation = next((name for name in ACTIVATIONS if name in json.dumps(activation_fn)), activation)
+
+        space = data['action_space']
+        kwargs = {}
+        if 'Box' in space[':type:']:
+            kwargs.update(action_low=_parse_array(space['low']), action_high=_parse_array(space['high']),
+                          log_std=state.get('log_std'))
+        elif 'MultiDiscrete' in space[':type:']:
+            kwargs['nvec'] = _parse_array(space['nvec'], np.int64)
+        else:
+            kwargs['nvec'] = [int(space['n'])]
+        return cls(layers, (state['action_net.weight'], state['action_net.bias']), activation, **kwargs)
+
+    @classmethod
+    def load(cls, path):
+        """A model from a .zip saved by SB3 or an .npz written by export()."""
+        if not path.endswith('.npz'):
+            return cls.from_zip(path)
+        with np.load(path) as f:
+            layers = [(f[f'w{k}'], f[f'b{k}']) for k in range(int(f['num_layers']))]
+            optional = {key: f[key] for key in ('action_low', 'action_high', 'nvec', 'log_std') if key in f}
+            return cls(layers, (f['head_w'], f['head_b']), str(f['activation']), **optional)
+
+    def export(self, path):
+        """Write the weights to an .npz that load() reads back with NumPy alone."""
+        arrays = {'num_layers': len(self.layers), 'head_w': self.head[0], 'head_b': self.head[1],
+                  'activation': self.activation}
+        for k, (w, b) in enumerate(self.layers):
+            arrays[f'w{k}'], arrays[f'b{k}'] = w, b
+        for key in ('action_low', 'action_high', 'nvec', 'log_std'):
+            if getattr(self, key) is not None:
+                arrays[key] = getattr(self, key)
+        np.savez(path, **arrays)
+
+    def forward(self, obs):
+        x = np.asarray(obs, dtype=np.float32).reshape(-1, self.obs_dim)
+        activation = ACTIVATIONS[self.activation]
+        for w, b in self.layers:
+            x = activation(x @ w.T + b)
+        return x @ self.head[0].T + self.head[1]
+
+    def predict(self, obs, deterministic=True):
+        """Actions for one observation or a batch, shaped like SB3's predict() output."""
+        single = np.ndim(obs) == 1
+        out = self.forward(obs)
+        if self.nvec is None:
+            if not deterministic and self.log_std is not None:
+                out = out + np.exp(self.log_std) * self._rng.standard_normal(out.shape, dtype=np.float32)
+            actions = np.clip(out, self.action_low, self.action_high)
+        else:
+            actions = np.empty((len(out), len(self.nvec)), dtype=np.int64)
+            for d, logits in enumerate(np.split(out, np.cumsum(self.nvec)[:-1], axis=1)):
+                if deterministic:
+                    actions[:, d] = logits.argmax(axis=1)
+                else:
+                    p = np.exp(logits - logits.max(axis=1, keepdims=True))
+                    p /= p.sum(axis=1, keepdims=True)
+                    actions[:, d] = (p.cumsum(axis=1) > self._rng.random((len(p), 1))).argmax(axis=1)
+        return (actions[0] if single else actions), None
+
+
+class BatchingServer:
+    """
+    Runs a policy on micro-batches gathered from many callers.
+
+    submit() queues one observation and returns a Future for its action. A
+    background thread takes the first waiting request, keeps collecting for
+    up to max_wait_ms or until max_batch_size requests are in, then answers
+    the whole batch with one forward pass.
+    """
+
+    def __init__(self, policy, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, deterministic=True):
+        self.policy = policy
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1e3
+        self.deterministic = deterministic
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._obs = np.empty((max_batch_size, policy.obs_dim), dtype=np.float32)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, obs):
+        future = Future()
+        self._queue.put((obs, future))
+        return future
+
+    def predict(self, obs):
+        return self.submit(obs).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    @property
+    def mean_batch_size(self):
+        return self.requests / self.batches if self.batches else 0.0
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Finish this batch, stop on the next loop
+                    break
+                batch.append(item)
+
+            obs = self._obs[:len(batch)]
+            for k, (request, _) in enumerate(batch):
+                obs[k] = request
+            try:
+                actions, _ = self.policy.predict(obs, deterministic=self.deterministic)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for k, (_, future) in enumerate(batch):
+                future.set_result(actions[k])
+            self.batches += 1
+            self.requests += len(batch)
+
+
+def _recv_exactly(conn, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    while size:
+        n = conn.recv_into(view, size)
+        if not n:
+            return None
+        view, size = view[n:], size - n
+    return buf
+
+
+def serve(server, address=DEFAULT_SOCKET):
+    """
+    Answer requests on a local socket until the process ends; returns the listening socket.
+
+    address is a path (Unix socket) or a (host, port) pair. The protocol is
+    fixed-size float32 frames: each request is one observation, each reply
+    one action, so a connection is a plain request/response stream.
+    """
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.remove(address)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(address)
+    listener.listen()
+    obs_bytes = 4 * server.policy.obs_dim
+
+    def handle(conn):
+        with conn:
+            while True:
+                frame = _recv_exactly(conn, obs_bytes)
+                if frame is None:
+                    return
+                action = server.predict(np.frombuffer(frame, dtype=np.float32))
+                conn.sendall(np.asarray(action, dtype=np.float32).tobytes())
+
+    def accept():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener
+
+
+class InferenceClient:
+    """Blocking client for serve(): predict(obs) sends one observation and waits for its action."""
+
+    def __init__(self, address=DEFAULT_SOCKET, action_dim=2):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.action_bytes = 4 * action_dim
+
+    def predict(self, obs):
+        self.sock.sendall(np.asarray(obs, dtype=np.float32).tobytes())
+        return np.frombuffer(_recv_exactly(self.sock, self.action_bytes), dtype=np.float32)
+
+    def close(self):
+        self.sock.close()
+
+
+def _client_process(address, obs_dim, action_dim, seconds, results):
+    client = InferenceClient(address, action_dim)
+    rng = np.random.default_rng(os.getpid())
+    obs = rng.uniform(0, 400, (256, obs_dim)).astype(np.float32)
+    latencies = []
+    end = time.perf_counter() + seconds
+    k = 0
+    while time.perf_counter() < end:
+        start = time.perf_counter_ns()
+        client.predict(obs[k % len(obs)])
+        latencies.append(time.perf_counter_ns() - start)
+        k += 1
+    client.close()
+    results.put(latencies)
+
+
+def main():
+    import multiprocessing as mp
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='soccer_stars_ppo.zip', help="SB3 .zip or exported .npz")
+    parser.add_argument('--export', help="Also write the NumPy weights to this .npz")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    parser.add_argument('--clients', type=int, default=8, help="Local client processes for the load test")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    policy = NumpyPolicy.load(args.model)
+    if args.export:
+        policy.export(args.export)
+    server = BatchingServer(policy, args.max_batch_size, args.max_wait_ms)
+    listener = serve(server, args.socket)
+
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    clients = [ctx.Process(target=_client_process,
+                           args=(args.socket, policy.obs_dim, policy.action_dim, args.seconds, results))
+               for _ in range(args.clients)]
+    for client in clients:
+        client.start()
+    latencies = np.concatenate([np.asarray(results.get(), dtype=np.float64) for _ in clients]) / 1e3
+    for client in clients:
+        client.join()
+    listener.close()
+    server.close()
+
+    print(f"{args.clients} clients, {len(latencies):,} requests: {len(latencies) / args.seconds:,.0f} req/s, "
+          f"p50 {np.percentile(latencies, 50):.0f}us, p99 {np.percentile(latencies, 99):.0f}us, "
+          f"mean batch {server.mean_batch_size:.1f}")
+
+
+if __name__ == '__main__':
+    main()
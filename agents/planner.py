@@ -0,0 +1,243 @@
+"""
+Shot-search planner for turn-based Soccer Stars.
+
+Every candidate (disc, angle, force) flick is played out on the game
+physics and the resulting position is scored with the offensive and
+defensive rules from player_behavior.txt: put the ball in the goal, knock
+opponents away from their goal, and never leave our own goal open. The
+search starts on a coarse grid of shots and keeps refining around the best
+ones until the time budget runs out.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from agents.transposition import TranspositionTable
+from env.physics import SOCCER_STARS_TABLE
+from env.soccer_stars_env import SoccerStarsEnv
+
+# Coarse grid and refinement
+COARSE_ANGLE_STEP = 15.0
+COARSE_FORCES = (0.35, 0.65, 1.0)
+REFINE_TOP_K = 4
+REFINE_POINTS = 5  # Angles tried around each kept shot, forces get three
+
+# Heuristic weights, in points per pixel unless noted
+GOAL_SCORE = 1000.0
+BALL_PROGRESS = 1.0  # Ball closer to the opponents' goal
+OPPONENT_CLEARANCE = 0.1  # Opponent discs pushed away from their goal
+GOAL_COVER = 0.5  # Our nearest disc off the ball-to-goal line
+OPEN_GOAL_DISTANCE = 150  # No disc of ours within this of our goal counts as an open goal
+OPEN_GOAL_PENALTY = 150.0
+
+# Set in every pool worker by _init_worker; a single-process planner keeps its own pair
+_worker_env = None
+_worker_table = None
+
+
+class Shot:
+    """The planner's answer: which disc to flick, how, and how good it looked."""
+
+    def __init__(self, disc, angle, force, score):
+        self.disc = disc
+        self.angle = angle
+        self.force = force
+        self.score = score
+
+    def __repr__(self):
+        return f"Shot(disc={self.disc}, angle={self.angle:.1f}, force={self.force:.2f}, score={self.score:.1f})"
+
+
+def _make_simulator(players_per_side, num_balls, table_bytes):
+    """The turn-based env whose world plays the shots out, and the transposition table caching them."""
+    env = SoccerStarsEnv(players_per_side=players_per_side, num_balls=num_balls, turn_based=True)
+    return env, TranspositionTable(angle_step=0.5, force_step=0.01, max_bytes=table_bytes)
+
+
+def _init_worker(players_per_side, num_balls, table_bytes):
+    global _worker_env, _worker_table
+    _worker_env, _worker_table = _make_simulator(players_per_side, num_balls, table_bytes)
+
+
+def _simulate_batch(pos, shots, deadline=None):
+    """_simulate() on the pool worker's own env and table."""
+    return _simulate(_worker_env, _worker_table, pos, shots, deadline)
+
+
+def _simulate(env, table, pos, shots, deadline=None):
+    """
+    Final positions (k, num_bodies, 2) and goals (k,) for shots given as rows of (disc, angle, force).
+
+    Past `deadline` (a time.time() value, comparable across processes) the
+    remaining shots are skipped, so k can be shorter than the batch; the
+    first shot always runs.
+    """
+    world = env.world
+    world.pos[0] = pos
+    world.vel[0] = 0
+    finals = np.empty((len(shots),) + pos.shape, dtype=np.float32)
+    goals = np.empty(len(shots), dtype=np.int8)
+    for k, (disc, angle, force) in enumerate(shots):
+        if k and deadline is not None and time.time() >= deadline:
+            return finals[:k], goals[:k]
+        finals[k], goals[k], _ = table.evaluate(world, int(disc), angle, force, env.MAX_SHOT_SPEED)
+    return finals, goals
+
+
+def score_outcomes(finals, goals, team, players_per_side):
+    """
+    Heuristic value of each final position for `team` (0 attacks the right goal, 1 the left one).
+
+    finals is (k, num_bodies, 2) and goals (k,) as returned by check_goals.
+    """
+    t = SOCCER_STARS_TABLE
+    n = players_per_side
+    centre_y = t.height / 2
+    own_x, their_x = (t.boundary_left, t.boundary_right) if team == 0 else (t.boundary_right, t.boundary_left)
+    direction = 1 if team == 0 else -1
+    ours = finals[:, team * n:(team + 1) * n]
+    theirs = finals[:, (1 - team) * n:(2 - team) * n]
+    ball = finals[:, 2 * n]
+
+    # Offense: the ball moves towards their goal, their discs get pushed off it
+    score = -BALL_PROGRESS * np.hypot(ball[:, 0] - their_x, ball[:, 1] - centre_y)
+    score += OPPONENT_CLEARANCE * np.hypot(theirs[..., 0] - their_x, theirs[..., 1] - centre_y).mean(axis=1)
+
+    # Defense: one of our discs sits on the line from the ball to our goal...
+    own_goal = np.array([own_x, centre_y], dtype=np.float32)
+    line = own_goal - ball
+    along = np.einsum('kbc,kc->kb', ours - ball[:, None], line) / np.maximum(np.einsum('kc,kc->k', line, line), 1e-6)[:, None]
+    closest = ball[:, None] + np.clip(along, 0, 1)[..., None] * line[:, None]
+    score -= GOAL_COVER * np.hypot(*(ours - closest).transpose(2, 0, 1)).min(axis=1)
+    # ...and the goal is never left wide open
+    guard = np.hypot(ours[..., 0] - own_x, ours[..., 1] - centre_y).min(axis=1)
+    score -= OPEN_GOAL_PENALTY * (guard > OPEN_GOAL_DISTANCE)
+
+    return np.where(goals != 0, GOAL_SCORE * goals * direction, score)
+
+
+class ShotPlanner:
+    """
+    Picks the best flick for one side within a wall-clock budget.
+
+    Candidate shots are simulated in batches, spread over a process pool
+    when workers > 1 (every worker keeps its own physics world and
+    transposition table, so repeated positions are lookups). After the
+    coarse pass the search zooms in around the REFINE_TOP_K best shots,
+    halving the angle and force steps each round, and returns the best shot
+    found when the budget or max_rounds is used up.
+    """
+
+    def __init__(self, players_per_side=1, num_balls=1, workers=None, budget=0.5, max_rounds=4,
+                 table_bytes=32 * 2 ** 20):
+        self.players_per_side = players_per_side
+        self.num_balls = num_balls
+        self.workers = os.cpu_count() if workers is None else workers
+        self.budget = budget
+        self.max_rounds = max_rounds
+        self.pool = None
+        self._simulator = None  # (env, table) when shots are played out in this process
+        init_args = (players_per_side, num_balls, table_bytes)
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=init_args)
+        else:
+            self._simulator = _make_simulator(*init_args)
+
+    def plan(self, pos, team=0, discs=None, budget=None):
+        """
+        Best Shot for `team` from positions `pos` (num_bodies, 2).
+
+        discs limits which of the team's discs may shoot, as indices within
+        the team (SoccerStarsEnv only ever flicks disc 0).
+        """
+        deadline = time.perf_counter() + (self.budget if budget is None else budget)
+        pos = np.asarray(pos, dtype=np.float32)
+        n = self.players_per_side
+        discs = np.arange(n) if discs is None else np.asarray(discs)
+        shooters = team * n + discs
+
+        angles = np.arange(0, 360, COARSE_ANGLE_STEP)
+        grid = np.array(np.meshgrid(shooters, angles, COARSE_FORCES, indexing='ij')).reshape(3, -1).T
+        angle_step, force_step = COARSE_ANGLE_STEP, COARSE_FORCES[1] - COARSE_FORCES[0]
+
+        tried, scores = self._evaluate(pos, grid, team, deadline)
+        for _ in range(self.max_rounds):
+            if time.perf_counter() >= deadline:
+                break
+            angle_step, force_step = angle_step / 2, force_step / 2
+            candidates = self._refine(tried[np.argsort(-scores)[:REFINE_TOP_K]], angle_step, force_step)
+            new_tried, new_scores = self._evaluate(pos, candidates, team, deadline)
+            tried, scores = np.concatenate([tried, new_tried]), np.concatenate([scores, new_scores])
+
+        best = int(np.argmax(scores))
+        disc, angle, force = tried[best]
+        return Shot(int(disc) - team * n, float(angle % 360), float(force), float(scores[best]))
+
+    def predict(self, obs, deterministic=True):
+        """SoccerStarsEnv action for player 1, shaped like a stable-baselines3 predict()."""
+        pos = np.asarray(obs).reshape(-1, 4)[:, :2]
+        shot = self.plan(pos, team=0, discs=[0])
+        return np.array([shot.angle, shot.force], dtype=np.float32), None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def _refine(self, best, angle_step, force_step):
+        offsets = np.linspace(-1, 1, REFINE_POINTS) * angle_step
+        shots = []
+        for disc, angle, force in best:
+            for da in offsets:
+                for df in (-force_step, 0, force_step):
+                    shots.append((disc, (angle + da) % 360, np.clip(force + df, 0.05, 1.0)))
+        return np.array(shots)
+
+    def _evaluate(self, pos, shots, team, deadline):
+        """Simulate and score as many of `shots` as fit before the deadline; at least one batch always runs."""
+        batches = np.array_split(shots, max(1, min(len(shots), 4 * max(1, self.workers))))
+        results = []
+        # Workers check the deadline between shots: cancel() cannot stop a batch that is already running
+        wall_deadline = time.time() + (deadline - time.perf_counter())
+
+        if self.pool is None:
+            for batch in batches:
+                finals, goals = _simulate(*self._simulator, pos, batch, wall_deadline)
+                results.append((batch[:len(finals)], finals, goals))
+                if time.perf_counter() >= deadline:
+                    break
+        else:
+            futures = {self.pool.submit(_simulate_batch, pos, batch, wall_deadline): batch for batch in batches}
+            pending = set(futures)
+            while pending:
+                timeout = max(0.0, deadline - time.perf_counter()) if results else None
+                finished, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not finished:
+                    break
+                for future in finished:
+                    finals, goals = future.result()
+                    results.append((futures[future][:len(finals)], finals, goals))
+            for future in pending:
+                future.cancel()
+
+        done_shots, finals, goals = (np.concatenate(parts) for parts in zip(*results))
+        return done_shots, score_outcomes(finals, goals, team, self.players_per_side)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Plan a kickoff shot and report how far the search got.")
+    parser.add_argument("--players-per-side", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--budget", type=float, default=0.5, help="Seconds per move")
+    args = parser.parse_args()
+
+    env = SoccerStarsEnv(players_per_side=args.players_per_side, turn_based=True)
+    planner = ShotPlanner(args.players_per_side, workers=args.workers, budget=args.budget)
+    start = time.perf_counter()
+    shot = planner.plan(env.world.pos[0])
+    print(f"{shot} in {time.perf_counter() - start:.3f}s")
+    planner.close()
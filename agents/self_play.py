@@ -0,0 +1,151 @@
+"""
+Self-play against a pool of frozen past policies.
+
+The learning agent keeps its side (team2 in air hockey, player 1 in Soccer
+Stars) and the other side is played by a snapshot of an earlier version of
+itself. Snapshots are kept in memory as CPU state dicts; one of them is
+loaded into a single frozen copy of the policy network at a time, so every
+step costs one extra forward pass for all envs together.
+"""
+import copy
+import random
+
+import numpy as np
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnvWrapper
+
+from env import air_hockey_env, soccer_stars_env
+
+POOL_SIZE = 8               # Snapshots kept; the oldest is evicted first
+SNAPSHOT_FREQ = 10000       # Timesteps between snapshots
+SWAP_FREQ = 2048            # Vectorized steps between opponent draws
+LATEST_PROBABILITY = 0.5    # Chance to face the newest snapshot, otherwise a uniform draw
+
+
+class OpponentPool:
+    """Size-capped, in-memory pool of policy snapshots with one frozen network to run them."""
+
+    def __init__(self, max_size=POOL_SIZE, latest_probability=LATEST_PROBABILITY, seed=None):
+        self.max_size = max_size
+        self.latest_probability = latest_probability
+        self.snapshots = []  # (timesteps, state dict) oldest first
+        self.policy = None
+        self.current = None
+        self._random = random.Random(seed)
+
+    def add(self, policy, timesteps=0):
+        """Snapshot `policy`'s weights, evicting the oldest snapshot once the pool is full."""
+        state = {key: value.detach().cpu().clone() for key, value in policy.state_dict().items()}
+        self.snapshots.append((timesteps, state))
+        if len(self.snapshots) > self.max_size:
+            self.snapshots.pop(0)
+        if self.policy is None:
+            self.policy = copy.deepcopy(policy).to('cpu')
+            self.policy.set_training_mode(False)
+            for parameter in self.policy.parameters():
+                parameter.requires_grad_(False)
+
+    def sample(self):
+        """Load a snapshot into the frozen network: the newest one or a uniform draw."""
+        if not self.snapshots:
+            return None
+        if self._random.random() < self.latest_probability:
+            timesteps, state = self.snapshots[-1]
+        else:
+            timesteps, state = self._random.choice(self.snapshots)
+        self.policy.load_state_dict(state)
+        self.current = timesteps
+        return timesteps
+
+    def act(self, obs, deterministic=False):
+        """Actions for a whole batch of (already mirrored) observations in one forward pass."""
+        with torch.no_grad():
+            actions, _ = self.policy.predict(obs, deterministic=deterministic)
+        return actions
+
+    @property
+    def memory_bytes(self):
+        return sum(value.numel() * value.element_size() for _, state in self.snapshots for value in state.values())
+
+    def __len__(self):
+        return len(self.snapshots)
+
+
+class SelfPlayVecEnv(VecEnvWrapper):
+    """
+    Drives the opponent side of every env from the pool, with one batched forward pass per step.
+
+    game is 'air_hockey' or 'soccer_stars'. Observations are mirrored so the
+    pool's policies play the other side exactly as they learned to play
+    their own. Envs that implement set_opponent_actions (BatchedAirHockeyEnv)
+    take the whole batch at once; others get theirs through env_method.
+    Until the pool holds a snapshot the opponent stands still, as before.
+    """
+
+    def __init__(self, venv, pool, game='air_hockey', players_per_side=1, swap_freq=SWAP_FREQ):
+        super(SelfPlayVecEnv, self).__init__(venv)
+        self.pool = pool
+        self.game = game
+        self.players_per_side = players_per_side
+        self.swap_freq = swap_freq
+        self._steps = 0
+        self._obs = None
+        self._mirrored = np.empty((self.num_envs,) + self.observation_space.shape, dtype=np.float32)
+
+    def reset(self):
+        self._obs = self.venv.reset()
+        return self._obs
+
+    def step_async(self, actions):
+        if self._steps % self.swap_freq == 0:
+            self.pool.sample()
+        self._steps += 1
+        if self.pool.current is not None:
+            self._send_opponent_actions(self._opponent_actions(self._obs))
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        self._obs = obs
+        return obs, rewards, dones, infos
+
+    def _opponent_actions(self, obs):
+        if self.game == 'air_hockey':
+            return self.pool.act(air_hockey_env.mirror_obs(obs, out=self._mirrored))
+        mirrored = soccer_stars_env.mirror_obs(obs, self.players_per_side, out=self._mirrored)
+        return soccer_stars_env.mirror_action(self.pool.act(mirrored))
+
+    def _send_opponent_actions(self, actions):
+        if hasattr(self.venv, 'set_opponent_actions'):
+            self.venv.set_opponent_actions(actions)
+            return
+        # Other VecEnvs take one call per env
+        for i in range(self.num_envs):
+            self.venv.env_method('set_opponent_action', actions[i], indices=[i])
+
+
+class SelfPlayCallback(BaseCallback):
+    """Adds a snapshot of the learning policy to the pool at the start and every snapshot_freq timesteps."""
+
+    def __init__(self, pool, snapshot_freq=SNAPSHOT_FREQ, verbose=0):
+        super(SelfPlayCallback, self).__init__(verbose)
+        self.pool = pool
+        self.snapshot_freq = snapshot_freq
+        self._next_snapshot = 0
+
+    def _on_training_start(self):
+        self._snapshot()
+
+    def _on_step(self):
+        if self.num_timesteps >= self._next_snapshot:
+            self._snapshot()
+        return True
+
+    def _snapshot(self):
+        self.pool.add(self.model.policy, self.num_timesteps)
+        self._next_snapshot = self.num_timesteps + self.snapshot_freq
+        self.logger.record('self_play/pool_size', len(self.pool))
+        self.logger.record('self_play/pool_mb', self.pool.memory_bytes / 2 ** 20)
+        if self.verbose:
+            print(f"Opponent pool: {len(self.pool)} snapshots, newest from {self.num_timesteps} timesteps")
@@ -0,0 +1,145 @@
+"""
+Transposition table for shot outcomes.
+
+Search keeps asking the same question: what happens if this disc is flicked
+at this angle and force from (nearly) this position? The table answers it
+once. A board state is keyed by its disc and ball positions snapped to a
+grid, a shot by its angle and force snapped to their own steps, and the
+simulated outcome is stored under the pair. Least recently used entries are
+evicted once the table grows past its memory cap.
+"""
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+# Rough per-entry cost of the OrderedDict node and the outcome tuple, on top of the key and arrays
+ENTRY_OVERHEAD = 200
+# Settling ticks for worlds that cannot use event-driven shot resolution
+MAX_SHOT_TICKS = 2000
+
+
+def simulate_shot(world, shooter, angle, force, speed, index=0):
+    """
+    Flick disc `shooter` of world `index` and play the shot out until everything stops or a goal is scored.
+
+    The world is restored afterwards. Returns (final_pos, goal, ticks) with
+    final_pos a (num_bodies, 2) float32 copy. Worlds with one friction factor
+    use DiscWorld.resolve_shot; others (air hockey, with a slipperier puck)
+    are stepped tick by tick.
+    """
+    pos, vel = world.pos[index], world.vel[index]
+    # Stepping moves every world, so the whole state is saved
+    saved = world.get_state()
+
+    angle_rad = np.radians(angle)
+    vel[shooter] = (force * np.cos(angle_rad) * speed, force * np.sin(angle_rad) * speed)
+
+    friction = world.friction[0, 0]
+    if np.all(world.friction == friction) and 0 < friction < 1:
+        goal, ticks = world.resolve_shot(index)
+    else:
+        goal, ticks = 0, 0
+        while ticks < MAX_SHOT_TICKS and np.abs(vel).max() > 0.05:
+            goal = int(world.step()[index])
+            ticks += 1
+            if goal:
+                break
+
+    outcome = (pos.astype(np.float32), int(goal), float(ticks))
+    world.set_state(saved)
+    return outcome
+
+
+class TranspositionTable:
+    """
+    LRU cache of (quantized board state, discretized shot) -> shot outcome.
+
+    grid is the position cell size in pixels, angle_step (degrees) and
+    force_step the shot resolution. Every shot is snapped before it is
+    simulated, so a cached outcome is exact for the snapped shot from the
+    first position seen in that cell. max_bytes caps the estimated memory of
+    the stored keys and outcomes.
+    """
+
+    def __init__(self, grid=2.0, angle_step=2.0, force_step=0.05, max_bytes=64 * 2 ** 20):
+        self.grid = grid
+        self.angle_step = angle_step
+        self.force_step = force_step
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def snap_shot(self, angle, force):
+        """The (angle, force) actually simulated for a requested shot."""
+        angle = round((angle % 360) / self.angle_step) * self.angle_step % 360
+        force = min(1.0, round(force / self.force_step) * self.force_step)
+        return angle, force
+
+    def key(self, pos, shooter, angle, force):
+        cells = np.floor(np.asarray(pos) / self.grid + 0.5).astype(np.int32)
+        shot = (shooter, round((angle % 360) / self.angle_step), round(force / self.force_step))
+        return cells.tobytes() + np.array(shot, dtype=np.int32).tobytes()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, outcome):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = outcome
+        self.memory_bytes += self._entry_size(key, outcome)
+        while self.memory_bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, old_outcome = self._entries.popitem(last=False)
+            self.memory_bytes -= self._entry_size(old_key, old_outcome)
+            self.evictions += 1
+
+    def evaluate(self, world, shooter, angle, force, speed, index=0):
+        """Outcome of a shot from the current state of world `index`, simulated only on a miss."""
+        angle, force = self.snap_shot(angle, force)
+        key = self.key(world.pos[index], shooter, angle, force)
+        outcome = self.get(key)
+        if outcome is None:
+            outcome = simulate_shot(world, shooter, angle, force, speed, index)
+            self.put(key, outcome)
+        return outcome
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'memory_bytes': self.memory_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self.memory_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @staticmethod
+    def _entry_size(key, outcome):
+        return sys.getsizeof(key) + outcome[0].nbytes + ENTRY_OVERHEAD
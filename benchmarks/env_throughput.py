@@ -0,0 +1,214 @@
+"""
+Throughput of the environments, the game loop physics, observations and rendering.
+
+Every case reports steps/sec, per-call latency percentiles and the memory
+a call allocates on top of what it keeps (peak traced bytes). Results can
+be written to JSON and compared with an earlier run:
+
+    python -m benchmarks.env_throughput --output baseline.json
+    python -m benchmarks.env_throughput --baseline baseline.json --threshold 0.1
+
+Throughput is the median over `repeats` rounds of the measuring time, so
+one noisy round does not flag a regression. The comparison exits with
+status 1 when any case's median lost more than `threshold` of its baseline
+throughput.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+BATCH_ENVS = 64
+ALLOC_SAMPLES = 200
+REPEATS = 5  # Rounds per case; the median throughput is reported
+
+
+def _air_hockey_step():
+    from env.air_hockey_env import AirHockeyEnv
+    env = AirHockeyEnv()
+    env.reset()
+    action = np.array([0, 1, 2])
+    return lambda: env.step(action), 1
+
+
+def _air_hockey_reset():
+    from env.air_hockey_env import AirHockeyEnv
+    env = AirHockeyEnv()
+    return env.reset, 1
+
+
+def _batched_air_hockey_step(reward_shaping=False):
+    from env.batched_air_hockey_env import BatchedAirHockeyEnv
+    env = BatchedAirHockeyEnv(num_envs=BATCH_ENVS, reward_shaping=reward_shaping)
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 3, size=(BATCH_ENVS, 3))
+
+    def step():
+        env.step_async(actions)
+        env.step_wait()
+    return step, BATCH_ENVS
+
+
+def _soccer_stars_step():
+    from env.soccer_stars_env import SoccerStarsEnv
+    env = SoccerStarsEnv()
+    action = np.array([30.0, 0.5])
+
+    def step():
+        if env.step(action)[2]:
+            env.reset()
+    return step, 1
+
+
+def _soccer_stars_shot():
+    from env.soccer_stars_env import SoccerStarsEnv
+    env = SoccerStarsEnv(players_per_side=5, turn_based=True)
+    rng = np.random.default_rng(0)
+
+    def shot():
+        env.step(np.array([rng.uniform(0, 360), rng.uniform(0.2, 1.0)]))
+    return shot, 1, env.reset  # Every shot starts from the kickoff, reset outside the timing
+
+
+def _game_loop_tick():
+    from positions import GameLoop
+    game = GameLoop(headless=True, ai=True)
+    game.puck_vel[:] = (7, 3)  # Keep the puck moving so collisions are part of the cost
+    return game.tick, 1
+
+
+def _air_hockey_obs():
+    from env.batched_air_hockey_env import BatchedAirHockeyEnv
+    env = BatchedAirHockeyEnv(num_envs=BATCH_ENVS)
+    out = np.empty((BATCH_ENVS, 16), dtype=np.float32)
+    return lambda: env.get_obs(out), BATCH_ENVS
+
+
+def _soccer_stars_obs():
+    from env.soccer_stars_env import SoccerStarsEnv
+    env = SoccerStarsEnv(players_per_side=5)
+    return env._get_obs, 1
+
+
+def _soccer_stars_render():
+    from env.soccer_stars_env import SoccerStarsEnv
+    env = SoccerStarsEnv(players_per_side=5)
+    return lambda: env.render(mode='rgb_array'), 1
+
+
+# name -> setup returning (call, env steps per call), optionally with an untimed call run before each one
+CASES = {
+    'air_hockey.step': _air_hockey_step,
+    'air_hockey.reset': _air_hockey_reset,
+    'batched_air_hockey.step': _batched_air_hockey_step,
+    'batched_air_hockey.step_shaped': lambda: _batched_air_hockey_step(reward_shaping=True),
+    'soccer_stars.step': _soccer_stars_step,
+    'soccer_stars.shot': _soccer_stars_shot,
+    'positions.tick': _game_loop_tick,
+    'air_hockey.obs_batched': _air_hockey_obs,
+    'soccer_stars.obs': _soccer_stars_obs,
+    'soccer_stars.render': _soccer_stars_render,
+}
+
+
+def measure(call, steps_per_call, seconds, prepare=None, repeats=REPEATS):
+    """
+    Time `call` for about `seconds` in `repeats` rounds, then sample its allocations separately under tracemalloc.
+
+    prepare, if given, runs before every call and is left out of the
+    timings and allocations.
+    """
+    prepare = prepare or (lambda: None)
+    for _ in range(10):
+        prepare()
+        call()  # Warm up caches and compiled kernels
+
+    latencies, rounds = [], []
+    for _ in range(repeats):
+        deadline = time.perf_counter() + seconds / repeats
+        start = len(latencies)
+        while True:
+            prepare()
+            t0 = time.perf_counter_ns()
+            call()
+            latencies.append(time.perf_counter_ns() - t0)
+            if time.perf_counter() >= deadline:
+                break
+        rounds.append((len(latencies) - start) * steps_per_call / (sum(latencies[start:]) / 1e9))
+
+    tracemalloc.start()
+    allocated = []
+    for _ in range(ALLOC_SAMPLES):
+        prepare()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) / 1e3
+    return {
+        'steps_per_sec': float(np.median(rounds)),
+        'steps_per_sec_rounds': rounds,
+        'calls': len(latencies),
+        'steps_per_call': steps_per_call,
+        'latency_us': {f'p{q}': float(np.percentile(latencies, q)) for q in (50, 90, 99)},
+        'alloc_bytes_per_step': float(np.mean(allocated)) / steps_per_call,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Names of the cases whose throughput fell more than `threshold` below the baseline."""
+    failed = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['steps_per_sec'] / baseline[name]['steps_per_sec']
+        status = 'ok'
+        if ratio < 1 - threshold:
+            status = 'REGRESSION'
+            failed.append(name)
+        print(f"{name:<26} {ratio:>7.2f}x of baseline  {status}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--seconds', type=float, default=2.0, help="Measuring time per case")
+    parser.add_argument('--repeats', type=int, default=REPEATS, help="Rounds the measuring time is split into")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare with the results in this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed throughput drop, as a fraction")
+    args = parser.parse_args()
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    results = {}
+    print(f"{'case':<26} {'steps/sec':>12} {'p50 us':>9} {'p99 us':>9} {'alloc B/step':>13}")
+    for name in args.cases:
+        call, steps_per_call, *prepare = CASES[name]()
+        result = results[name] = measure(call, steps_per_call, args.seconds, *prepare, repeats=args.repeats)
+        print(f"{name:<26} {result['steps_per_sec']:>12,.0f} {result['latency_us']['p50']:>9.1f} "
+              f"{result['latency_us']['p99']:>9.1f} {result['alloc_bytes_per_step']:>13,.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'machine': platform.machine(),
+                       'numpy': np.__version__, 'cases': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+        failed = compare(results, baseline, args.threshold)
+        if failed:
+            print(f"Throughput regressed by more than {args.threshold:.0%} in: {', '.join(failed)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
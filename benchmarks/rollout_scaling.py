@@ -0,0 +1,62 @@
+"""
+Rollout throughput of SharedMemoryVecEnv from 1 to N workers.
+
+    python -m benchmarks.rollout_scaling --env air_hockey --num-envs 32 --max-workers 8
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from env.air_hockey_env import AirHockeyEnv
+from env.shared_vec_env import SharedMemoryVecEnv
+from env.soccer_stars_env import SoccerStarsEnv
+
+ENVS = {'air_hockey': AirHockeyEnv, 'soccer_stars': SoccerStarsEnv}
+
+
+def measure(env_cls, num_envs, num_workers, seconds):
+    """Steps per second (summed over all envs) for one worker count."""
+    vec_env = SharedMemoryVecEnv([env_cls] * num_envs, num_workers=num_workers)
+    try:
+        vec_env.reset()
+        actions = np.array([vec_env.action_space.sample() for _ in range(num_envs)])
+        vec_env.step(actions)  # Warm up the workers
+
+        steps = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            vec_env.step(actions)
+            steps += num_envs
+        return steps / (time.perf_counter() - start)
+    finally:
+        vec_env.close()
+
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--env', choices=sorted(ENVS), default='air_hockey')
+    parser.add_argument('--num-envs', type=int, default=32)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seconds', type=float, default=3.0, help="Measuring time per worker count")
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'steps/sec':>12} {'speedup':>8}")
+    for num_workers in worker_counts(min(args.max_workers, args.num_envs)):
+        rate = measure(ENVS[args.env], args.num_envs, num_workers, args.seconds)
+        baseline = baseline or rate
+        print(f"{num_workers:>8} {rate:>12,.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Cold-start cost of the environments and training scripts, each in a fresh interpreter.
+
+    python -m benchmarks.startup --repeats 5
+
+For every target this reports the import time, the time of its first
+construction, and which heavy dependencies ended up loaded. A rollout
+worker pays the import and construction once per process.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('gym', 'numba', 'pygame', 'torch', 'stable_baselines3', 'cv2')
+
+# name -> (import statement, construction expression or None)
+TARGETS = {
+    'AirHockeyEnv': ('from env.air_hockey_env import AirHockeyEnv', 'AirHockeyEnv()'),
+    'SoccerStarsEnv': ('from env.soccer_stars_env import SoccerStarsEnv', 'SoccerStarsEnv()'),
+    'BatchedAirHockeyEnv': ('from env.batched_air_hockey_env import BatchedAirHockeyEnv', 'BatchedAirHockeyEnv(8)'),
+    'BatchedAirHockeyVecEnv': ('from env.batched_vec_env import BatchedAirHockeyVecEnv', 'BatchedAirHockeyVecEnv(8)'),
+    'rollout worker': ('import env.rollout_worker', None),
+    'train.py': ('import train', None),
+    'train_soccer_stars.py': ('import train_soccer_stars', None),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+imported = time.perf_counter()
+{construct}
+built = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'construct': built - imported,
+                  'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(statement, construct):
+    code = PROBE.format(statement=statement, construct=construct or 'pass', heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=3, help="Fresh interpreters per target, the median is shown")
+    args = parser.parse_args()
+
+    print(f"{'target':<24} {'import ms':>10} {'construct ms':>13}  loaded")
+    for name, (statement, construct) in TARGETS.items():
+        runs = [probe(statement, construct) for _ in range(args.repeats)]
+        import_ms = 1e3 * np.median([run['import'] for run in runs])
+        construct_ms = 1e3 * np.median([run['construct'] for run in runs])
+        print(f"{name:<24} {import_ms:>10.0f} {construct_ms:>13.0f}  {', '.join(runs[-1]['loaded']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,18 @@
-__all__ = ['AirHockeyEnv']  # Defines what gets imported with `from env import *`
+__all__ = ['AirHockeyEnv', 'BatchedAirHockeyEnv', 'BatchedAirHockeyVecEnv']  # Defines what gets imported with `from env import *`
 
+# Loaded on first access, so `import env.physics` in a rollout worker does not pull in stable-baselines3
+_LAZY = {
+    'AirHockeyEnv': 'env.air_hockey_env',
+    'BatchedAirHockeyEnv': 'env.batched_air_hockey_env',
+    'BatchedAirHockeyVecEnv': 'env.batched_vec_env',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module 'env' has no attribute {name!r}")
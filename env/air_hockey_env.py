@@ -1,7 +1,10 @@
 import gym
 from gym import spaces
 import numpy as np
-import math
+
+from env.physics import AIR_HOCKEY_TABLE, DiscWorld
+from env.scenarios import CURRICULUM_STATE_SIZE, Curriculum, ScenarioSampler
+from env.shaping import PotentialShaping
 
 WIDTH, HEIGHT = 800, 400
 PADDLE_RADIUS = 20
@@ -19,10 +22,76 @@ GOAL_LEFT_X = BOUNDARY_LEFT - GOAL_WIDTH
 GOAL_RIGHT_X = BOUNDARY_RIGHT
 GOAL_Y = HEIGHT // 2 - GOAL_HEIGHT // 2
 
+SCENARIO_PUCK_SPEED = 6  # Practice scenarios start with the puck moving, see env/scenarios.py
+
+# Vertical velocity for each action: Up, Down, Stay
+ACTION_VELOCITY = np.array([-3, 3, 0], dtype=np.float32)
+
+# get_state() layout: DiscWorld state (positions, velocities), both scores, done, shaping potential, curriculum
+WORLD_STATE_SIZE = 4 * 7
+STATE_SIZE = WORLD_STATE_SIZE + 4 + CURRICULUM_STATE_SIZE
+
+KICKOFF_POSITIONS = np.array(
+    [[100, HEIGHT // 4], [100, HEIGHT // 2], [100, 3 * HEIGHT // 4],
+     [WIDTH - 100, HEIGHT // 4], [WIDTH - 100, HEIGHT // 2], [WIDTH - 100, 3 * HEIGHT // 4]],
+    dtype=np.float32,
+)
+
+
+def make_world(num_worlds=1, **kwargs):
+    """Three paddles per team plus the puck, on the interactive game's table."""
+    return DiscWorld(
+        AIR_HOCKEY_TABLE,
+        radius=[PADDLE_RADIUS] * 6 + [PUCK_RADIUS],
+        friction=[PADDLE_FRICTION] * 6 + [PUCK_FRICTION],
+        teams=([0, 1, 2], [3, 4, 5]),
+        num_worlds=num_worlds,
+        wall_radius=PADDLE_RADIUS,
+        **kwargs,
+    )
+
+
+def get_obs(world, out):
+    """
+    Write the observation of every world into `out`, shape (num_worlds, 16), without allocating.
+
+    Layout: team1 then team2 paddle positions, puck position, puck velocity.
+    """
+    out[:, :14] = world.pos.reshape(world.num_worlds, 14)
+    out[:, 14:16] = world.vel[:, 6]
+    return out
+
+
+def mirror_obs(obs, out=None):
+    """
+    Observations as seen from team1: the table flipped left to right and the team blocks swapped.
+
+    A policy trained to move team2 can then move team1 from the result.
+    Actions need no mapping, paddles only move vertically.
+    """
+    obs = np.asarray(obs)
+    if out is None:
+        out = np.empty_like(obs)
+    out[..., 0:6] = obs[..., 6:12]
+    out[..., 6:12] = obs[..., 0:6]
+    out[..., 12:16] = obs[..., 12:16]
+    out[..., 0:14:2] = WIDTH - out[..., 0:14:2]
+    out[..., 14] = -out[..., 14]
+    return out
+
+
 class AirHockeyEnv(gym.Env):
     metadata = {'render.modes': ['human']}
 
-    def __init__(self):
+    def __init__(self, copy_obs=False, reward_shaping=False, curriculum=False):
+        """
+        Observations are written into one preallocated float32 buffer that is
+        reused every step. Pass copy_obs=True to get an independent array
+        from reset() and step() instead. reward_shaping=True adds the dense
+        potential-based terms of env/shaping.py to the goal rewards.
+        curriculum=True starts episodes from the practice scenarios of
+        env/scenarios.py instead of the kickoff.
+        """
         super(AirHockeyEnv, self).__init__()
         self.action_space = spaces.MultiDiscrete([3, 3, 3])  # Up, Down, Stay for 3 paddles
         self.observation_space = spaces.Box(
@@ -32,90 +101,103 @@ class AirHockeyEnv(gym.Env):
             dtype=np.float32,
         )
 
+        # Views into the shared physics arrays, updated in place every step
+        self.world = make_world()
+        self.team1_positions = self.world.pos[0, 0:3]
+        self.team2_positions = self.world.pos[0, 3:6]
+        self.team1_velocities = self.world.vel[0, 0:3]
+        self.team2_velocities = self.world.vel[0, 3:6]
+        self.puck_pos = self.world.pos[0, 6]
+        self.puck_vel = self.world.vel[0, 6]
+
+        self.copy_obs = copy_obs
+        self._obs = np.empty((1, 16), dtype=np.float32)
+        self.opponent_action = None  # Team1's actions, see set_opponent_action
+        self.shaping = PotentialShaping(self.world) if reward_shaping else None
+        self.curriculum = None
+        if curriculum:
+            self.curriculum = Curriculum(ScenarioSampler(
+                self.world, KICKOFF_POSITIONS, fixed_x=True, ball_speed=SCENARIO_PUCK_SPEED))
+
         self.reset()
 
     def reset(self):
-        self.team1_positions = [[100, HEIGHT // 4], [100, HEIGHT // 2], [100, 3 * HEIGHT // 4]]
-        self.team2_positions = [[WIDTH - 100, HEIGHT // 4], [WIDTH - 100, HEIGHT // 2], [WIDTH - 100, 3 * HEIGHT // 4]]
-        self.team1_velocities = [[0, 0] for _ in range(3)]
-        self.team2_velocities = [[0, 0] for _ in range(3)]
-        self.puck_pos = [WIDTH // 2, HEIGHT // 2]
-        self.puck_vel = [0, 0]
+        if self.curriculum is not None:
+            self.curriculum.reset()
+        else:
+            self.world.pos[0, :6] = KICKOFF_POSITIONS
+            self.world.vel[:] = 0
+            self.world.reset_ball()
         self.scores = [0, 0]
         self.done = False
+        if self.shaping is not None:
+            self.shaping.reset()
         return self._get_obs()
 
     def step(self, action):
-        for i in range(3):
-            if action[i] == 0:
-                self.team2_velocities[i][1] = -3
-            elif action[i] == 1:
-                self.team2_velocities[i][1] = 3
-            else:
-                self.team2_velocities[i][1] = 0
-
-        for i in range(3):
-            self._update_position_with_bounds(self.team2_positions[i], self.team2_velocities[i], PADDLE_FRICTION)
-            self._update_position_with_bounds(self.team1_positions[i], self.team1_velocities[i], PADDLE_FRICTION)
+        self.team2_velocities[:, 1] = ACTION_VELOCITY[np.asarray(action)]
+        if self.opponent_action is not None:
+            self.team1_velocities[:, 1] = ACTION_VELOCITY[np.asarray(self.opponent_action)]
 
-        self._update_position_with_bounds(self.puck_pos, self.puck_vel, PUCK_FRICTION)
-
-        for i in range(3):
-            self._handle_paddle_collision(self.team1_positions[i], self.team1_velocities[i])
-            self._handle_paddle_collision(self.team2_positions[i], self.team2_velocities[i])
-
-        reward, self.done = self._check_goals()
+        goals = self.world.step()
+        reward, self.done = self._check_goals(goals[0])
+        if self.done and self.curriculum is not None:
+            self.curriculum.record(goals[0])
+        if self.shaping is not None:
+            reward += float(self.shaping.step(self.done)[0])
 
         return self._get_obs(), reward, self.done, {}
 
+    def get_state(self, out=None):
+        """
+        The whole game as a flat float64 array of STATE_SIZE: physics, scores, done flag, shaping potential
+        and curriculum.
+
+        set_state() puts it back, far cheaper than copy.deepcopy(env). The
+        only randomness is the curriculum's scenario sampler, whose generator
+        is saved along with the stage and win window (zeros without a
+        curriculum). BatchedAirHockeyEnv.set_states takes the same rows.
+        """
+        state = np.empty(STATE_SIZE) if out is None else out
+        self.world.get_state(out=state[None, :WORLD_STATE_SIZE])
+        state[WORLD_STATE_SIZE:WORLD_STATE_SIZE + 2] = self.scores
+        state[WORLD_STATE_SIZE + 2] = self.done
+        state[WORLD_STATE_SIZE + 3] = self.shaping.last[0] if self.shaping is not None else 0
+        if self.curriculum is not None:
+            self.curriculum.get_state(out=state[WORLD_STATE_SIZE + 4:])
+        else:
+            state[WORLD_STATE_SIZE + 4:] = 0
+        return state
+
+    def set_state(self, state):
+        if len(state) != STATE_SIZE:
+            raise ValueError(f"AirHockeyEnv states hold {STATE_SIZE} values, got {len(state)}")
+        self.world.set_state(state[:WORLD_STATE_SIZE])
+        self.scores = [int(state[WORLD_STATE_SIZE]), int(state[WORLD_STATE_SIZE + 1])]
+        self.done = bool(state[WORLD_STATE_SIZE + 2])
+        if self.shaping is not None:
+            self.shaping.last[0] = state[WORLD_STATE_SIZE + 3]
+        if self.curriculum is not None:
+            self.curriculum.set_state(state[WORLD_STATE_SIZE + 4:])
+
+    def set_opponent_action(self, action):
+        """Team1's Up/Down/Stay actions for the following steps; None keeps its paddles as they are."""
+        self.opponent_action = action
+
     def render(self, mode='human'):
         print(f"Team 1: {self.scores[0]} | Team 2: {self.scores[1]}")
 
     def _get_obs(self):
-        return np.array(
-            self.team1_positions + self.team2_positions + [self.puck_pos] + [self.puck_vel]
-        ).flatten()
-
-    def _update_position_with_bounds(self, pos, vel, friction):
-        pos[0] += vel[0]
-        pos[1] += vel[1]
-        vel[0] *= friction
-        vel[1] *= friction
-
-        pos[0] = np.clip(pos[0], BOUNDARY_LEFT + PADDLE_RADIUS, BOUNDARY_RIGHT - PADDLE_RADIUS)
-        pos[1] = np.clip(pos[1], BOUNDARY_TOP + PADDLE_RADIUS, BOUNDARY_BOTTOM - PADDLE_RADIUS)
-
-    def _handle_paddle_collision(self, paddle_pos, paddle_vel):
-        dx = self.puck_pos[0] - paddle_pos[0]
-        dy = self.puck_pos[1] - paddle_pos[1]
-        distance = math.sqrt(dx ** 2 + dy ** 2)
-
-        if distance < PADDLE_RADIUS + PUCK_RADIUS:
-            angle = math.atan2(dy, dx)
-            overlap = PADDLE_RADIUS + PUCK_RADIUS - distance
-            self.puck_pos[0] += overlap * math.cos(angle)
-            self.puck_pos[1] += overlap * math.sin(angle)
-
-            relative_velocity_x = self.puck_vel[0] - paddle_vel[0]
-            relative_velocity_y = self.puck_vel[1] - paddle_vel[1]
-            collision_velocity = (relative_velocity_x * math.cos(angle) +
-                                  relative_velocity_y * math.sin(angle))
-
-            if collision_velocity < 0:
-                self.puck_vel[0] -= 2 * collision_velocity * math.cos(angle)
-                self.puck_vel[1] -= 2 * collision_velocity * math.sin(angle)
-
-    def _check_goals(self):
-        if self.puck_pos[0] <= GOAL_LEFT_X:
+        get_obs(self.world, self._obs)
+        return self._obs[0].copy() if self.copy_obs else self._obs[0]
+
+    def _check_goals(self, goal):
+        if goal < 0:
             self.scores[1] += 1
-            self._reset_puck()
+            self.world.reset_ball()
             return -1, True
-        elif self.puck_pos[0] >= GOAL_RIGHT_X:
+        elif goal > 0:
             self.scores[0] += 1
-            self._reset_puck()
+            self.world.reset_ball()
             return 1, True
         return 0, False
-
-    def _reset_puck(self):
-        self.puck_pos = [WIDTH // 2, HEIGHT // 2]
-        self.puck_vel = [0, 0]
@@ -0,0 +1,229 @@
+import inspect
+
+import numpy as np
+from gymnasium import spaces  # stable-baselines3 2.x only accepts gymnasium spaces on a VecEnv
+
+from env.air_hockey_env import (
+    WIDTH, HEIGHT, ACTION_VELOCITY, KICKOFF_POSITIONS, SCENARIO_PUCK_SPEED, STATE_SIZE, WORLD_STATE_SIZE,
+    get_obs, make_world,
+)
+from env.scenarios import Curriculum, ScenarioSampler
+from env.shaping import PotentialShaping
+
+OBS_DIM = 16
+
+
+class BatchedAirHockeyEnv:
+    """
+    N air hockey tables advanced together with NumPy.
+
+    Follows the same rules as AirHockeyEnv but keeps every table in (N, ...)
+    arrays, so one step() call moves all games at once. Finished tables are
+    reset in place and their last observation is returned in
+    info["terminal_observation"], as stable-baselines3 expects from a VecEnv.
+
+    Observations, rewards and dones are written into two preallocated
+    buffers used in turn, since stable-baselines3 still reads the previous
+    step's observation after calling step(). Pass copy_obs=True to get fresh
+    arrays instead, e.g. when keeping observations for longer.
+    reward_shaping=True adds the dense potential-based terms of
+    env/shaping.py to every table's goal rewards. curriculum=True resets
+    tables to the practice scenarios of env/scenarios.py, all in one call.
+
+    The class has the VecEnv interface without subclassing it, so importing
+    it does not load stable-baselines3 and torch; training wraps it in
+    env.batched_vec_env.BatchedAirHockeyVecEnv.
+    """
+
+    metadata = {'render.modes': []}
+    render_mode = None
+
+    def __init__(self, num_envs=8, copy_obs=False, reward_shaping=False, curriculum=False):
+        self.observation_space = spaces.Box(
+            low=0,
+            high=max(WIDTH, HEIGHT),
+            shape=(OBS_DIM,),
+            dtype=np.float32,
+        )
+        self.action_space = spaces.MultiDiscrete([3, 3, 3])  # Up, Down, Stay for 3 paddles
+        self.num_envs = num_envs
+
+        # Paddle slots 0-2 are team1, 3-5 are team2, the puck is last
+        self.world = make_world(num_worlds=num_envs)
+        self.paddle_pos = self.world.pos[:, :6]
+        self.paddle_vel = self.world.vel[:, :6]
+        self.puck_pos = self.world.pos[:, 6]
+        self.puck_vel = self.world.vel[:, 6]
+        self.scores = np.zeros((num_envs, 2), dtype=np.int32)
+        self.copy_obs = copy_obs
+        self._slot = 0
+        self._obs = np.empty((2, num_envs, OBS_DIM), dtype=np.float32)
+        self._rewards = np.empty((2, num_envs), dtype=np.float32)
+        self._dones = np.empty((2, num_envs), dtype=bool)
+        self._actions = np.full((num_envs, 3), 2, dtype=np.int64)
+        self._team2_vy = np.empty((num_envs, 3), dtype=np.float32)
+        self._opponent_actions = None
+        self._team1_vy = np.empty((num_envs, 3), dtype=np.float32)
+        self.shaping = PotentialShaping(self.world) if reward_shaping else None
+        self.curriculum = None
+        if curriculum:
+            self.curriculum = Curriculum(ScenarioSampler(
+                self.world, KICKOFF_POSITIONS, fixed_x=True, ball_speed=SCENARIO_PUCK_SPEED))
+
+        self._reset_tables(np.ones(num_envs, dtype=bool))
+
+    def reset(self):
+        self._reset_tables(np.ones(self.num_envs, dtype=bool))
+        self._slot ^= 1
+        return self._output(self.get_obs(self._obs[self._slot]))
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions).reshape(self.num_envs, 3)
+
+    def step_wait(self):
+        # Only team2 is driven by the agent, team1 keeps its own velocity
+        np.take(ACTION_VELOCITY, self._actions, out=self._team2_vy)
+        self.paddle_vel[:, 3:, 1] = self._team2_vy
+        if self._opponent_actions is not None:
+            np.take(ACTION_VELOCITY, self._opponent_actions, out=self._team1_vy)
+            self.paddle_vel[:, :3, 1] = self._team1_vy
+
+        goals = self.world.step()
+        self._slot ^= 1
+        obs, rewards, dones = self._obs[self._slot], self._rewards[self._slot], self._dones[self._slot]
+        self._check_goals(goals, rewards, dones)
+        if self.shaping is not None:
+            rewards += self.shaping.step(dones)
+        self.get_obs(obs)
+        infos = [{} for _ in range(self.num_envs)]
+
+        if dones.any():
+            for i in np.flatnonzero(dones):
+                infos[i]["terminal_observation"] = obs[i].copy()
+            self._reset_tables(dones)
+            self.get_obs(obs)
+
+        return self._output(obs), self._output(rewards), self._output(dones), infos
+
+    def set_opponent_actions(self, actions):
+        """Team1's actions for every table, (num_envs, 3); None keeps its paddles as they are."""
+        self._opponent_actions = None if actions is None else np.asarray(actions).reshape(self.num_envs, 3)
+
+    def get_states(self, indices=None, out=None):
+        """
+        Snapshots of the selected tables (all by default), one AirHockeyEnv.get_state() row each.
+
+        The done column is always 0: finished tables are reset straight away.
+        Every row carries the same curriculum columns, as all the tables
+        share one curriculum.
+        """
+        indices = np.arange(self.num_envs) if indices is None else np.asarray(indices)
+        if out is None:
+            out = np.empty((len(indices), STATE_SIZE))
+        self.world.get_state(indices, out=out[:, :WORLD_STATE_SIZE])
+        out[:, WORLD_STATE_SIZE:WORLD_STATE_SIZE + 2] = self.scores[indices]
+        out[:, WORLD_STATE_SIZE + 2] = 0
+        out[:, WORLD_STATE_SIZE + 3] = self.shaping.last[indices] if self.shaping is not None else 0
+        out[:, WORLD_STATE_SIZE + 4:] = self.curriculum.get_state() if self.curriculum is not None else 0
+        return out
+
+    def set_states(self, states, indices=None):
+        """
+        Restore snapshot rows into the selected tables in one go; a single row goes to all of them.
+
+        Restoring one AirHockeyEnv.get_state() into every table and stepping
+        each with its own actions runs num_envs branches of one position.
+        The shared curriculum is restored from the last row.
+        """
+        states = np.asarray(states)
+        if states.shape[-1] != STATE_SIZE:
+            raise ValueError(f"AirHockeyEnv state rows hold {STATE_SIZE} values, got {states.shape[-1]}")
+        indices = np.arange(self.num_envs) if indices is None else np.asarray(indices)
+        self.world.set_state(states[..., :WORLD_STATE_SIZE], indices)
+        self.scores[indices] = states[..., WORLD_STATE_SIZE:WORLD_STATE_SIZE + 2]
+        if self.shaping is not None:
+            self.shaping.last[indices] = states[..., WORLD_STATE_SIZE + 3]
+        if self.curriculum is not None:
+            self.curriculum.set_state(np.atleast_2d(states)[-1, WORLD_STATE_SIZE + 4:])
+
+    def get_obs(self, out=None):
+        """Fill a caller-supplied (num_envs, 16) float32 array with the current observations."""
+        if out is None:
+            out = np.empty((self.num_envs, OBS_DIM), dtype=np.float32)
+        return get_obs(self.world, out)
+
+    def reset_tables(self, mask, out=None):
+        """Reset only the tables in `mask` and return every table's observation, written into `out` if given."""
+        self._reset_tables(np.asarray(mask, dtype=bool))
+        return self.get_obs(out)
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        # The dynamics are deterministic; the only RNG is the curriculum's scenario sampler
+        if self.curriculum is not None:
+            self.curriculum.sampler.rng = np.random.default_rng(seed)
+        return [seed] * self.num_envs
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._check_all_tables(f"set_attr({attr_name!r})", indices)
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """
+        Call a method of the batch once.
+
+        Methods taking `indices` (get_states, set_states) get the selected
+        tables and their result is split into one entry per table. Any other
+        method acts on every table, so it cannot be called for only some.
+        """
+        method = getattr(self, method_name)
+        if 'indices' in inspect.signature(method).parameters:
+            selected = list(self._get_indices(indices))
+            result = method(*method_args, indices=selected, **method_kwargs)
+            return [None] * len(selected) if result is None else list(result)
+        self._check_all_tables(f"env_method({method_name!r})", indices)
+        return [method(*method_args, **method_kwargs)] * self.num_envs
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        return [indices] if isinstance(indices, int) else indices
+
+    def _check_all_tables(self, call, indices):
+        if indices is not None and sorted(set(self._get_indices(indices))) != list(range(self.num_envs)):
+            raise NotImplementedError(f"{call} acts on every table of the batch and cannot select indices")
+
+    def _reset_tables(self, mask):
+        if self.curriculum is not None:
+            self.curriculum.reset(mask)
+        else:
+            self.paddle_pos[mask] = KICKOFF_POSITIONS
+            self.paddle_vel[mask] = 0
+            self.world.reset_ball(mask)
+        self.scores[mask] = 0
+        if self.shaping is not None:
+            self.shaping.reset(mask)
+
+    def _output(self, array):
+        return array.copy() if self.copy_obs else array
+
+    def _check_goals(self, goals, rewards, dones):
+        np.not_equal(goals, 0, out=dones)
+        rewards[:] = goals
+        if dones.any():
+            if self.curriculum is not None:
+                self.curriculum.record(goals[dones])
+            self.scores[goals < 0, 1] += 1
+            self.scores[goals > 0, 0] += 1
@@ -0,0 +1,18 @@
+"""
+stable-baselines3 VecEnv adapter for BatchedAirHockeyEnv.
+
+Kept apart from env/batched_air_hockey_env.py so that evaluation, the
+benchmarks and anything else that only steps the tables do not import
+stable-baselines3 and torch. Training imports this module instead.
+"""
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from env.batched_air_hockey_env import BatchedAirHockeyEnv
+
+
+class BatchedAirHockeyVecEnv(BatchedAirHockeyEnv, VecEnv):
+    """BatchedAirHockeyEnv as a VecEnv subclass, which stable-baselines3 requires of vectorized envs."""
+
+    def __init__(self, num_envs=8, copy_obs=False, reward_shaping=False, curriculum=False):
+        BatchedAirHockeyEnv.__init__(self, num_envs, copy_obs, reward_shaping, curriculum)
+        VecEnv.__init__(self, num_envs, self.observation_space, self.action_space)
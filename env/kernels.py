@@ -0,0 +1,216 @@
+"""
+Compiled step kernel for DiscWorld, and the shaping potential of env/shaping.py.
+
+When numba is installed load() compiles `step_worlds` in no-Python mode and
+DiscWorld uses it for tables small enough to skip the broad phase. Without
+numba load() returns None and DiscWorld keeps its NumPy implementation.
+Numba is only imported by the first load(), so importing this module
+stays cheap.
+The kernel follows the NumPy path operation for operation: overlaps are
+detected first, then resolved in the original contact order.
+
+`shaping_potential` is compiled alongside it and computes the same phi as
+PotentialShaping's NumPy path, one world at a time.
+
+Run `python -m env.kernels` to check that both backends produce the same
+trajectories.
+"""
+import math
+
+import numpy as np
+
+step_worlds = None  # Set by load()
+shaping_potential = None  # Set by load()
+_loaded = False
+
+
+def _step_worlds(pos, vel, radius, friction, geometry, wall_radius, num_players,
+                 contacts, contact_distance, pairs, pair_distance, substeps, goals):
+    boundary_left, boundary_right, boundary_top, boundary_bottom, goal_y, goal_height, post_left, post_right = geometry
+    r = wall_radius
+    num_worlds, num_bodies = pos.shape[0], pos.shape[1]
+    ball = num_players
+    contact_hits = np.zeros(contacts.shape[0], dtype=np.bool_)
+    pair_hits = np.zeros(pairs.shape[0], dtype=np.bool_)
+
+    for w in range(num_worlds):
+        goals[w] = 0
+        for _ in range(substeps):
+            # Movement and friction
+            for b in range(num_bodies):
+                pos[w, b, 0] += vel[w, b, 0]
+                pos[w, b, 1] += vel[w, b, 1]
+                vel[w, b, 0] *= friction[b]
+                vel[w, b, 1] *= friction[b]
+
+            # Walls, open at the goal mouths
+            for b in range(num_bodies):
+                x, y = pos[w, b, 0], pos[w, b, 1]
+                outside_mouth = y < goal_y or y > goal_y + goal_height
+                if x - r < boundary_left:
+                    if outside_mouth:
+                        pos[w, b, 0] = boundary_left + r
+                        vel[w, b, 0] = -vel[w, b, 0]
+                elif x + r > boundary_right and outside_mouth:
+                    pos[w, b, 0] = boundary_right - r
+                    vel[w, b, 0] = -vel[w, b, 0]
+                if y - r < boundary_top:
+                    pos[w, b, 1] = boundary_top + r
+                    vel[w, b, 1] = -vel[w, b, 1]
+                elif y + r > boundary_bottom:
+                    pos[w, b, 1] = boundary_bottom - r
+                    vel[w, b, 1] = -vel[w, b, 1]
+
+            # Goal posts keep players out of the goals
+            for b in range(num_players):
+                x, y = pos[w, b, 0], pos[w, b, 1]
+                if goal_y < y < goal_y + goal_height:
+                    if x - r < post_left:
+                        pos[w, b, 0] = post_left + r
+                        vel[w, b, 0] = -vel[w, b, 0]
+                    elif x + r > post_right:
+                        pos[w, b, 0] = post_right - r
+                        vel[w, b, 0] = -vel[w, b, 0]
+
+            # Ball against players
+            for k in range(contacts.shape[0]):
+                p = contacts[k]
+                dx = pos[w, ball, 0] - pos[w, p, 0]
+                dy = pos[w, ball, 1] - pos[w, p, 1]
+                contact_hits[k] = dx * dx + dy * dy < contact_distance[k] ** 2
+            for k in range(contacts.shape[0]):
+                if not contact_hits[k]:
+                    continue
+                p = contacts[k]
+                dx = pos[w, ball, 0] - pos[w, p, 0]
+                dy = pos[w, ball, 1] - pos[w, p, 1]
+                distance = math.hypot(dx, dy)
+                nx, ny = (dx / distance, dy / distance) if distance > 0 else (1.0, 0.0)
+                overlap = contact_distance[k] - distance
+                pos[w, ball, 0] += overlap * nx
+                pos[w, ball, 1] += overlap * ny
+                collision_velocity = ((vel[w, ball, 0] - vel[w, p, 0]) * nx +
+                                      (vel[w, ball, 1] - vel[w, p, 1]) * ny)
+                if collision_velocity < 0:
+                    vel[w, ball, 0] -= 2 * collision_velocity * nx
+                    vel[w, ball, 1] -= 2 * collision_velocity * ny
+
+            # Player against player
+            for k in range(pairs.shape[0]):
+                i, j = pairs[k, 0], pairs[k, 1]
+                dx = pos[w, j, 0] - pos[w, i, 0]
+                dy = pos[w, j, 1] - pos[w, i, 1]
+                pair_hits[k] = dx * dx + dy * dy < pair_distance[k] ** 2
+            for k in range(pairs.shape[0]):
+                if not pair_hits[k]:
+                    continue
+                i, j = pairs[k, 0], pairs[k, 1]
+                dx = pos[w, j, 0] - pos[w, i, 0]
+                dy = pos[w, j, 1] - pos[w, i, 1]
+                distance = math.hypot(dx, dy)
+                nx, ny = (dx / distance, dy / distance) if distance > 0 else (1.0, 0.0)
+                push = (pair_distance[k] - distance) / 2
+                pos[w, i, 0] -= push * nx
+                pos[w, i, 1] -= push * ny
+                pos[w, j, 0] += push * nx
+                pos[w, j, 1] += push * ny
+                vix, viy = vel[w, i, 0], vel[w, i, 1]
+                vel[w, i, 0] = vel[w, j, 0] * nx
+                vel[w, i, 1] = vel[w, j, 1] * ny
+                vel[w, j, 0] = vix * nx
+                vel[w, j, 1] = viy * ny
+
+            # A goal ends this world's sub-steps
+            x, y = pos[w, ball, 0], pos[w, ball, 1]
+            if goal_y < y < goal_y + goal_height:
+                if x >= boundary_right:
+                    goals[w] = 1
+                elif x <= boundary_left:
+                    goals[w] = -1
+            if goals[w] != 0:
+                break
+
+
+def _shaping_potential(pos, ball, defenders, defender_reach, lane_clearance, lookup, cell, weights, out):
+    w_goal, w_cover, w_lane = weights[0], weights[1], weights[2]
+    max_row, max_col = lookup.shape[0] - 1, lookup.shape[1] - 1
+    for w in range(pos.shape[0]):
+        bx, by = pos[w, ball, 0], pos[w, ball, 1]
+        col = min(max(int(bx // cell), 0), max_col)
+        row = min(max(int(by // cell), 0), max_row)
+        distance, low, high, dir_x, dir_y, length = lookup[row, col]
+        phi = w_goal * distance
+
+        if w_cover:
+            hidden = 0.0
+            for k in range(defenders.shape[0]):
+                rx, ry = pos[w, defenders[k], 0] - bx, pos[w, defenders[k], 1] - by
+                dist = max(math.hypot(rx, ry), 1e-6)
+                angle = math.atan2(ry, rx)
+                half = math.asin(min(defender_reach[k] / dist, 1.0))
+                hidden += max(min(angle + half, high) - max(angle - half, low), 0.0)
+            phi -= w_cover * min(hidden / max(high - low, 1e-6), 1.0)
+
+        if w_lane:
+            openness = 1.0
+            for p in range(ball):
+                rx, ry = pos[w, p, 0] - bx, pos[w, p, 1] - by
+                along = min(max(rx * dir_x + ry * dir_y, 0.0), length)
+                gap = math.hypot(rx - along * dir_x, ry - along * dir_y) - lane_clearance[p]
+                openness = min(openness, min(max(gap / lane_clearance[p], 0.0), 1.0))
+            phi += w_lane * openness
+
+        out[w] = phi
+
+
+def load():
+    """The compiled step_worlds, or None without numba. Imports numba on the first call only."""
+    global step_worlds, shaping_potential, _loaded
+    if not _loaded:
+        _loaded = True
+        try:
+            from numba import njit
+        except ImportError:
+            return None
+        step_worlds = njit(cache=True)(_step_worlds)
+        shaping_potential = njit(cache=True)(_shaping_potential)
+    return step_worlds
+
+
+def check_equivalence(num_worlds=64, steps=1000, seed=0, atol=1e-6):
+    """
+    Run the same random games through the NumPy path and the kernel and compare every tick.
+
+    Both run in float64: the games are chaotic, so float32 rounding differences
+    between the backends would otherwise grow into visible divergence.
+    """
+    from env.air_hockey_env import KICKOFF_POSITIONS, make_world
+
+    if load() is None:
+        raise RuntimeError("numba is not installed, there is no compiled kernel to compare")
+
+    rng = np.random.default_rng(seed)
+    reference = make_world(num_worlds, backend='numpy', dtype=np.float64)
+    compiled = make_world(num_worlds, backend='numba', dtype=np.float64)
+    for world in (reference, compiled):
+        world.pos[:, :6] = KICKOFF_POSITIONS
+        world.reset_ball()
+    velocities = rng.normal(0, 6, reference.vel.shape)
+    reference.vel[:] = velocities
+    compiled.vel[:] = velocities
+
+    worst = 0.0
+    for _ in range(steps):
+        expected = reference.step()
+        actual = compiled.step()
+        worst = max(worst, float(np.abs(reference.pos - compiled.pos).max()))
+        if not np.array_equal(expected, actual) or worst > atol:
+            raise AssertionError(f"Backends diverged by {worst:.6f}px")
+        scored = expected != 0
+        reference.reset_ball(scored)
+        compiled.reset_ball(scored)
+    return worst
+
+
+if __name__ == '__main__':
+    print(f"Kernel matches NumPy reference, max position error {check_equivalence():.2e}px")
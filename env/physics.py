@@ -0,0 +1,483 @@
+import math
+
+import numpy as np
+
+from env import kernels
+
+
+class Table:
+    """Field geometry: a bounding box with a goal mouth cut into each end."""
+
+    def __init__(self, width, height, margin, goal_width, goal_height):
+        self.width = width
+        self.height = height
+        self.boundary_left = margin
+        self.boundary_right = width - margin
+        self.boundary_top = margin
+        self.boundary_bottom = height - margin
+        self.goal_width = goal_width
+        self.goal_height = goal_height
+        self.goal_left_x = self.boundary_left - goal_width
+        self.goal_right_x = self.boundary_right
+        self.goal_y = height // 2 - goal_height // 2
+
+
+AIR_HOCKEY_TABLE = Table(width=800, height=400, margin=50, goal_width=10, goal_height=100)
+SOCCER_STARS_TABLE = Table(width=800, height=400, margin=10, goal_width=10, goal_height=100)
+
+
+# Above this many bodies the pairwise tests cost more than sorting
+BROAD_PHASE_MIN_BODIES = 8
+
+# Shot resolution: discs slower than this (pixels per tick) count as stopped
+REST_SPEED = 0.05
+# Safety net for discs pinned against a wall, which would bounce forever
+MAX_SHOT_EVENTS = 500
+
+
+class DiscWorld:
+    """
+    Disc physics for one or many independent worlds, stored as struct-of-arrays.
+
+    Every body lives in the preallocated `pos`/`vel` arrays of shape
+    (num_worlds, num_bodies, 2) and all phases update them in place. Players
+    come first and the balls are always the last `num_balls` bodies, so
+    `pos[:, :num_players]` and `pos[:, ball]` are views. This is the one
+    implementation of the game rules used by positions.py, AirHockeyEnv,
+    BatchedAirHockeyEnv and SoccerStarsEnv.
+
+    Small tables (the 3v3 game) resolve contacts one pair at a time in the
+    original order. Larger pitches, or any pitch with several balls, use a
+    sort-and-sweep broad phase and resolve every contact in one vectorized
+    narrow phase; pass `broad_phase` to force either path.
+
+    Small tables step through the compiled kernel in env/kernels.py when
+    numba is installed (`backend='auto'`); `backend='numpy'` keeps the pure
+    NumPy path.
+    """
+
+    def __init__(self, table, radius, friction, teams, num_worlds=1, wall_radius=None, num_balls=1,
+                 broad_phase=None, backend='auto', dtype=np.float32):
+        self.table = table
+        self.num_worlds = num_worlds
+        self.num_bodies = len(radius)
+        self.num_balls = num_balls
+        self.num_players = self.num_bodies - num_balls
+        self.ball = self.num_players  # First ball
+        self.teams = [list(team) for team in teams]
+        if broad_phase is None:
+            broad_phase = num_balls > 1 or self.num_bodies > BROAD_PHASE_MIN_BODIES
+        elif not broad_phase and num_balls > 1:
+            raise ValueError("Pitches with several balls need the broad phase")
+        self.broad_phase = broad_phase
+
+        self.pos = np.zeros((num_worlds, self.num_bodies, 2), dtype=dtype)
+        self.vel = np.zeros((num_worlds, self.num_bodies, 2), dtype=dtype)
+        self.radius = np.asarray(radius, dtype=dtype)
+        self.friction = np.asarray(friction, dtype=dtype)[:, None]
+        # Walls and goal posts use one clearance for every body, like the interactive game
+        self.wall_radius = float(max(radius) if wall_radius is None else wall_radius)
+
+        # Ball contacts are resolved team1[i], team2[i], ... like the original loops
+        self.ball_contacts = np.array(
+            [player for group in zip(*self.teams) for player in group], dtype=np.intp
+        )
+        # Player pairs: within each team first, then across teams
+        pairs = []
+        longest = max(len(team) for team in self.teams)
+        for i in range(longest):
+            for j in range(i + 1, longest):
+                for team in self.teams:
+                    if j < len(team):
+                        pairs.append((team[i], team[j]))
+        for a in range(len(self.teams)):
+            for b in range(a + 1, len(self.teams)):
+                pairs.extend((i, j) for i in self.teams[a] for j in self.teams[b])
+        self.player_pairs = np.array(pairs, dtype=np.intp).reshape(-1, 2)
+
+        self._contact_distance = self.radius[self.ball_contacts] + self.radius[self.ball]
+        self.kernel = None
+        if backend == 'auto' and not broad_phase:
+            self.kernel = kernels.load()
+        elif backend == 'numba':
+            if kernels.load() is None:
+                raise ImportError("backend='numba' needs numba installed")
+            if broad_phase:
+                raise ValueError("The compiled kernel only covers tables without the broad phase")
+            self.kernel = kernels.step_worlds
+        self._geometry = (
+            float(table.boundary_left), float(table.boundary_right),
+            float(table.boundary_top), float(table.boundary_bottom),
+            float(table.goal_y), float(table.goal_height),
+            float(table.goal_left_x + table.goal_width), float(table.goal_right_x),
+        )
+        self._goals = np.zeros(num_worlds, dtype=np.int8)
+
+        self._all_pairs = np.triu_indices(self.num_bodies, 1)
+        self._all_pair_distance = self.radius[self._all_pairs[0]] + self.radius[self._all_pairs[1]]
+        self._pair_distance = self.radius[self.player_pairs[:, 0]] + self.radius[self.player_pairs[:, 1]]
+
+    def step(self):
+        """Advance every world by one tick and return the goal result per world."""
+        if self.kernel is not None:
+            return self.advance(1)
+        self.update_positions()
+        self.handle_wall_collisions()
+        if self.broad_phase:
+            self.handle_contacts()
+        else:
+            self.handle_ball_collisions()
+            self.handle_player_collisions()
+        return self.check_goals()
+
+    def advance(self, substeps):
+        """
+        Advance every world up to `substeps` ticks in one call.
+
+        A world stops at the tick it scores in, so its goal is never lost
+        between sub-steps. Returns the goal result per world; with the
+        compiled kernel this is a reused buffer, valid until the next call.
+        """
+        if self.kernel is not None:
+            self.kernel(
+                self.pos, self.vel, self.radius, self.friction.ravel(), self._geometry, self.wall_radius,
+                self.num_players, self.ball_contacts, self._contact_distance, self.player_pairs,
+                self._pair_distance, substeps, self._goals,
+            )
+            return self._goals
+
+        goals = np.zeros(self.num_worlds, dtype=np.int8)
+        for _ in range(substeps):
+            finished = goals != 0
+            if finished.any():
+                frozen = self.pos[finished], self.vel[finished]
+            step_goals = self.step()
+            if finished.any():
+                self.pos[finished], self.vel[finished] = frozen
+            goals = np.where(finished, goals, step_goals)
+        return goals
+
+    def update_positions(self):
+        self.pos += self.vel
+        self.vel *= self.friction
+
+    def handle_wall_collisions(self):
+        t = self.table
+        r = self.wall_radius
+        x, y = self.pos[..., 0], self.pos[..., 1]
+        vx, vy = self.vel[..., 0], self.vel[..., 1]
+
+        # Left and right walls block everything except the goal mouth
+        outside_mouth = (y < t.goal_y) | (y > t.goal_y + t.goal_height)
+        past_left = x - r < t.boundary_left
+        left = past_left & outside_mouth
+        right = ~past_left & (x + r > t.boundary_right) & outside_mouth
+        np.putmask(x, left, t.boundary_left + r)
+        np.putmask(x, right, t.boundary_right - r)
+        np.negative(vx, out=vx, where=left | right)
+
+        # Top and bottom walls
+        top = y - r < t.boundary_top
+        bottom = ~top & (y + r > t.boundary_bottom)
+        np.putmask(y, top, t.boundary_top + r)
+        np.putmask(y, bottom, t.boundary_bottom - r)
+        np.negative(vy, out=vy, where=top | bottom)
+
+        # Players that slipped into a goal mouth are pushed back onto the field
+        x, y = x[:, :self.num_players], y[:, :self.num_players]
+        vx = vx[:, :self.num_players]
+        in_mouth = (t.goal_y < y) & (y < t.goal_y + t.goal_height)
+        left = (x - r < t.goal_left_x + t.goal_width) & in_mouth
+        right = ~left & (x + r > t.goal_right_x) & in_mouth
+        np.putmask(x, left, t.goal_left_x + t.goal_width + r)
+        np.putmask(x, right, t.goal_right_x - r)
+        np.negative(vx, out=vx, where=left | right)
+
+    def handle_ball_collisions(self):
+        # Cheap vectorized overlap test first, then resolve only the contacts that exist
+        delta = self.pos[:, self.ball, None] - self.pos[:, self.ball_contacts]
+        hits = np.einsum('wkc,wkc->wk', delta, delta) < self._contact_distance ** 2
+        if not hits.any():
+            return
+        for k in np.flatnonzero(hits.any(axis=0)):
+            self._resolve_ball_contact(self.ball_contacts[k], self._contact_distance[k], hits[:, k])
+
+    def handle_player_collisions(self):
+        if not len(self.player_pairs):
+            return
+        delta = self.pos[:, self.player_pairs[:, 1]] - self.pos[:, self.player_pairs[:, 0]]
+        hits = np.einsum('wkc,wkc->wk', delta, delta) < self._pair_distance ** 2
+        if not hits.any():
+            return
+        for k in np.flatnonzero(hits.any(axis=0)):
+            i, j = self.player_pairs[k]
+            self._resolve_player_contact(i, j, self._pair_distance[k], hits[:, k])
+
+    def handle_contacts(self):
+        """Resolve every overlapping pair at once, using the sort-and-sweep candidates."""
+        world, i, j = sweep_and_prune(self.pos, self.radius, 4 * self.table.width)
+        delta = self.pos[world, j] - self.pos[world, i]
+        min_distance = self.radius[i] + self.radius[j]
+        hit = np.einsum('kc,kc->k', delta, delta) < min_distance ** 2
+        if not hit.any():
+            return
+        world, i, j, delta, min_distance = world[hit], i[hit], j[hit], delta[hit], min_distance[hit]
+        distance, normal = _distance_and_normal(delta)
+        overlap = (min_distance - distance)[:, None] * normal
+
+        # Pairs are ordered i < j and players come first, so j is the ball in mixed pairs
+        ball_i = i >= self.num_players
+        ball_j = j >= self.num_players
+        players = ~ball_j
+        mixed = ~ball_i & ball_j
+        balls = ball_i
+
+        vel_i = self.vel[world, i]
+        vel_j = self.vel[world, j]
+        collision_velocity = np.minimum(np.einsum('kc,kc->k', vel_j - vel_i, normal), 0)[:, None] * normal
+
+        # Player vs player and ball vs ball split the overlap, player vs ball moves only the ball
+        shared = players | balls
+        np.add.at(self.pos, (world[shared], i[shared]), -overlap[shared] / 2)
+        np.add.at(self.pos, (world[shared], j[shared]), overlap[shared] / 2)
+        np.add.at(self.pos, (world[mixed], j[mixed]), overlap[mixed])
+
+        # Players swap velocities along the collision angle, like the interactive game
+        self.vel[world[players], i[players]] = vel_j[players] * normal[players]
+        self.vel[world[players], j[players]] = vel_i[players] * normal[players]
+        # The ball bounces off a player and exchanges momentum with other balls
+        np.add.at(self.vel, (world[mixed], j[mixed]), -2 * collision_velocity[mixed])
+        np.add.at(self.vel, (world[balls], i[balls]), collision_velocity[balls])
+        np.add.at(self.vel, (world[balls], j[balls]), -collision_velocity[balls])
+
+    def check_goals(self):
+        """+1 where a ball is in the right goal (team1 scores), -1 for the left goal, else 0."""
+        t = self.table
+        x, y = self.pos[:, self.ball:, 0], self.pos[:, self.ball:, 1]
+        in_mouth = (t.goal_y < y) & (y < t.goal_y + t.goal_height)
+        right = (in_mouth & (x >= t.boundary_right)).sum(axis=1)
+        left = (in_mouth & (x <= t.boundary_left)).sum(axis=1)
+        return np.sign(right - left).astype(np.int8)
+
+    @property
+    def state_size(self):
+        return 4 * self.num_bodies
+
+    def get_state(self, worlds=None, out=None):
+        """
+        Positions then velocities of the selected worlds as flat rows, shape (n, state_size).
+
+        The rows are all there is to a world: set_state() with them puts it
+        back exactly, in this DiscWorld or any other with the same bodies.
+        """
+        worlds = slice(None) if worlds is None else worlds
+        pos, vel = self.pos[worlds], self.vel[worlds]
+        half = 2 * self.num_bodies
+        if out is None:
+            out = np.empty((len(pos), self.state_size), dtype=self.pos.dtype)
+        out[:, :half] = pos.reshape(-1, half)
+        out[:, half:] = vel.reshape(-1, half)
+        return out
+
+    def set_state(self, states, worlds=None):
+        """Restore rows from get_state() into the selected worlds; a single row goes to every one of them."""
+        states = np.asarray(states)
+        worlds = slice(None) if worlds is None else worlds
+        half = 2 * self.num_bodies
+        self.pos[worlds] = states[..., :half].reshape(-1, self.num_bodies, 2)
+        self.vel[worlds] = states[..., half:].reshape(-1, self.num_bodies, 2)
+
+    def reset_ball(self, mask=None):
+        """Put the balls back on the centre line, evenly spaced, and stop them."""
+        mask = slice(None) if mask is None else mask
+        spacing = np.arange(1, self.num_balls + 1) / (self.num_balls + 1)
+        self.pos[mask, self.ball:, 0] = self.table.width // 2
+        self.pos[mask, self.ball:, 1] = self.table.height * spacing
+        self.vel[mask, self.ball:] = 0
+
+    def resolve_shot(self, world=0, rest_speed=REST_SPEED, max_events=MAX_SHOT_EVENTS):
+        """
+        Simulate one world until every disc is at rest or a goal is scored.
+
+        Rather than stepping fixed ticks this jumps from one collision event to
+        the next. With a single friction factor f, a disc moving at v covers
+        v * (1 - f**t) / (1 - f) in t ticks along a straight line, so between
+        events every disc moves linearly in that travelled-distance parameter
+        and each time of impact is the root of a quadratic. Fast discs can
+        therefore never tunnel through each other.
+
+        Contacts are elastic with each disc's mass proportional to its area,
+        so a flicked player hands its momentum on to whatever it hits. Returns
+        (goal, ticks): goal is +1/-1/0 as in check_goals and ticks is the
+        simulated time, fractional ticks included.
+        """
+        friction = float(self.friction[0, 0])
+        if not np.all(self.friction == friction) or not 0 < friction < 1:
+            raise ValueError("Shot resolution needs the same friction below 1 for every disc")
+
+        pos, vel = self.pos[world], self.vel[world]
+        ticks = 0.0
+        for _ in range(max_events):
+            speed = np.hypot(vel[:, 0], vel[:, 1]).max()
+            if speed <= rest_speed:
+                break
+
+            # Distance parameter at which the fastest disc drops to the rest speed
+            horizon = (1 - rest_speed / speed) / (1 - friction)
+            travel, event = self._next_event(pos, vel, horizon)
+
+            # Advance every disc to the event; friction has scaled velocities by f**t
+            decay = 1 - travel * (1 - friction)
+            pos += vel * travel
+            vel *= decay
+            ticks += math.log(decay) / math.log(friction)
+
+            if event is None:
+                break
+            goal = self._apply_event(pos, vel, event)
+            if goal:
+                return goal, ticks
+
+        vel[:] = 0
+        return 0, ticks
+
+    def _next_event(self, pos, vel, horizon):
+        """Earliest (travel, event) within the horizon, or (horizon, None) if nothing happens."""
+        best, event = horizon, None
+
+        # Disc against disc: first root of |dp + dv * s| = ri + rj while they approach
+        i, j = self._all_pairs
+        dp = pos[j] - pos[i]
+        dv = vel[j] - vel[i]
+        a = np.einsum('kc,kc->k', dv, dv)
+        b = np.einsum('kc,kc->k', dp, dv)
+        c = np.einsum('kc,kc->k', dp, dp) - self._all_pair_distance ** 2
+        discriminant = b * b - a * c
+        approaching = (b < 0) & (discriminant >= 0)
+        if approaching.any():
+            travel = np.full(len(a), np.inf)
+            travel[approaching] = (-b[approaching] - np.sqrt(discriminant[approaching])) / a[approaching]
+            k = np.argmin(travel)
+            if travel[k] < best:
+                best, event = max(travel[k], 0.0), ('pair', i[k], j[k])
+
+        t = self.table
+        r = self.wall_radius
+        walls = ((0, t.boundary_left + r, t.boundary_right - r), (1, t.boundary_top + r, t.boundary_bottom - r))
+        for axis, low, high in walls:
+            p, v = pos[:, axis], vel[:, axis]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                travel = np.where(v < 0, (low - p) / v, np.where(v > 0, (high - p) / v, np.inf))
+            travel = np.maximum(travel, 0)
+            kind = np.full(self.num_bodies, 'wall', dtype=object)
+
+            if axis == 0:
+                # A ball reaching the end wall inside the goal mouth carries on to the goal line
+                balls = slice(self.ball, None)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    y = pos[balls, 1] + vel[balls, 1] * travel[balls]
+                    goal_line = np.where(v[balls] < 0, t.boundary_left - p[balls], t.boundary_right - p[balls]) / v[balls]
+                open_mouth = (t.goal_y < y) & (y < t.goal_y + t.goal_height)
+                travel[balls] = np.where(open_mouth, np.maximum(goal_line, 0), travel[balls])
+                kind[balls] = np.where(open_mouth, 'goal', 'wall')
+
+            k = np.argmin(travel)
+            if travel[k] < best:
+                best, event = travel[k], (kind[k], k, axis)
+
+        return best, event
+
+    def _apply_event(self, pos, vel, event):
+        kind, i, j = event
+        if kind == 'goal':
+            return 1 if vel[i, 0] > 0 else -1
+
+        if kind == 'wall':
+            # j is the axis; snap onto the wall so rounding cannot leak the disc through
+            t = self.table
+            r = self.wall_radius
+            low, high = ((t.boundary_left + r, t.boundary_right - r) if j == 0
+                         else (t.boundary_top + r, t.boundary_bottom - r))
+            pos[i, j] = min(max(pos[i, j], low), high)
+            vel[i, j] = -vel[i, j]
+            return 0
+
+        normal = pos[j] - pos[i]
+        normal /= max(math.hypot(normal[0], normal[1]), 1e-9)
+        collision_velocity = np.dot(vel[j] - vel[i], normal)
+        mass_i, mass_j = self.radius[i] ** 2, self.radius[j] ** 2
+        impulse = 2 * collision_velocity / (mass_i + mass_j)
+        vel[i] += impulse * mass_j * normal
+        vel[j] -= impulse * mass_i * normal
+        return 0
+
+    def _resolve_ball_contact(self, player, min_distance, mask):
+        ball_pos, ball_vel = self.pos[:, self.ball], self.vel[:, self.ball]
+        delta = ball_pos[mask] - self.pos[mask, player]
+        distance, normal = _distance_and_normal(delta)
+
+        # Move the ball fully outside the player
+        ball_pos[mask] += (min_distance - distance)[:, None] * normal
+
+        # Reflect the ball only if the two are moving towards each other
+        relative_velocity = ball_vel[mask] - self.vel[mask, player]
+        collision_velocity = np.einsum('wc,wc->w', relative_velocity, normal)
+        bounce = np.minimum(collision_velocity, 0)
+        ball_vel[mask] -= 2 * bounce[:, None] * normal
+
+    def _resolve_player_contact(self, i, j, min_distance, mask):
+        delta = self.pos[mask, j] - self.pos[mask, i]
+        distance, normal = _distance_and_normal(delta)
+
+        # Separate the players to prevent overlap
+        push = ((min_distance - distance) / 2)[:, None] * normal
+        self.pos[mask, i] -= push
+        self.pos[mask, j] += push
+
+        # Swap velocities along the collision angle
+        vel_i = self.vel[mask, i]
+        self.vel[mask, i] = self.vel[mask, j] * normal
+        self.vel[mask, j] = vel_i * normal
+
+
+def sweep_and_prune(pos, radius, stride):
+    """
+    Candidate contact pairs for every world, found by sorting disc extents along x.
+
+    The worlds are laid side by side `stride` apart so one sort covers the whole
+    batch. Returns (world, i, j) index arrays with i < j for each pair whose
+    bounding boxes overlap; exact distances are left to the narrow phase.
+    """
+    num_worlds, num_bodies, _ = pos.shape
+    offset = (np.arange(num_worlds) * stride)[:, None]
+    low = (pos[..., 0] - radius + offset).ravel()
+    high = (pos[..., 0] + radius + offset).ravel()
+
+    order = np.argsort(low, kind='stable')
+    low, high = low[order], high[order]
+    # Every body that starts before this one ends, later in the sort, overlaps it along x
+    end = np.searchsorted(low, high, side='left')
+    count = end - np.arange(len(low)) - 1
+    first = np.repeat(np.arange(len(low)), count)
+    run_start = np.repeat(np.cumsum(count) - count, count)
+    second = first + 1 + np.arange(len(first)) - run_start
+    a, b = order[first], order[second]
+
+    y = pos[..., 1].ravel()
+    reach = np.tile(radius, num_worlds)
+    keep = np.abs(y[a] - y[b]) < reach[a] + reach[b]
+    a, b = a[keep], b[keep]
+
+    world = a // num_bodies
+    i, j = a % num_bodies, b % num_bodies
+    return world, np.minimum(i, j), np.maximum(i, j)
+
+
+def _distance_and_normal(delta):
+    distance = np.hypot(delta[:, 0], delta[:, 1])
+    # atan2(0, 0) == 0, so coincident centres separate along +x
+    normal = np.zeros_like(delta)
+    normal[:, 0] = 1
+    apart = distance > 0
+    normal[apart] = delta[apart] / distance[apart, None]
+    return distance, normal
@@ -0,0 +1,180 @@
+import time
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+# DiscWorld phases, in the order step() runs them
+WORLD_PHASES = (
+    'update_positions',
+    'handle_wall_collisions',
+    'handle_ball_collisions',
+    'handle_player_collisions',
+    'handle_contacts',
+    'check_goals',
+)
+# The first phase that resolves disc contacts; collisions are counted just before it
+CONTACT_PHASES = ('handle_ball_collisions', 'handle_contacts')
+
+
+class StepProfiler:
+    """
+    Opt-in per-phase timers and collision counters for env.step.
+
+    attach(env) shadows the DiscWorld phase methods and the env's
+    observation builder with timed wrappers on those instances only, and
+    detach() removes them again, so an env that was never attached runs
+    exactly the code it always did. While attached the world takes the
+    NumPy path, because the compiled kernel fuses every phase into one call.
+
+    Timings are kept in nanoseconds per call; collisions per step count the
+    discs bouncing off a wall and the disc pairs overlapping when contacts
+    are resolved.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.wall_hits = []
+        self.contacts = []
+        self.total_ns = 0  # Time spent in timed phases, never cleared
+        self._attached = []
+
+    def attach(self, env):
+        """Instrument an env with a `world` (single or batched), or every env of a DummyVecEnv."""
+        if hasattr(env, 'envs'):
+            for sub_env in env.envs:
+                self.attach(sub_env)
+            return env
+        env = getattr(env, 'unwrapped', env)
+        world = env.world
+        self._attached.append((env, world, world.kernel))
+        world.kernel = None
+
+        for name in WORLD_PHASES:
+            method = getattr(world, name)
+            if name == 'handle_wall_collisions':
+                method = self._count_wall_hits(world, method)
+            elif name in CONTACT_PHASES:
+                method = self._count_contacts(world, method)
+            setattr(world, name, self._timed(name, method))
+
+        obs_name = '_get_obs' if hasattr(env, '_get_obs') else 'get_obs'
+        setattr(env, obs_name, self._timed('get_obs', getattr(env, obs_name)))
+        return env
+
+    def detach(self):
+        for env, world, kernel in self._attached:
+            for name in WORLD_PHASES:
+                world.__dict__.pop(name, None)
+            world.kernel = kernel
+            env.__dict__.pop('_get_obs', None)
+            env.__dict__.pop('get_obs', None)
+        self._attached = []
+
+    def record(self, name, nanoseconds):
+        self.durations.setdefault(name, []).append(nanoseconds)
+
+    def summary(self):
+        """Mean and p99 microseconds and call count per phase, plus mean collisions per step."""
+        report = {}
+        for name, values in self.durations.items():
+            if values:
+                us = np.asarray(values) / 1e3
+                report[name] = {'mean_us': float(us.mean()), 'p99_us': float(np.percentile(us, 99)), 'calls': len(us)}
+        for name, values in (('wall_hits', self.wall_hits), ('contacts', self.contacts)):
+            if values:
+                report[name] = {'mean_per_step': float(np.mean(values))}
+        return report
+
+    def clear(self):
+        for values in self.durations.values():
+            values.clear()
+        self.wall_hits.clear()
+        self.contacts.clear()
+
+    def _timed(self, name, method):
+        durations = self.durations.setdefault(name, [])
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            result = method(*args, **kwargs)
+            elapsed = clock() - start
+            durations.append(elapsed)
+            self.total_ns += elapsed
+            return result
+        return timed
+
+    def _count_wall_hits(self, world, method):
+        def counted():
+            before = world.vel.copy()
+            method()
+            # A bounce flips a non-zero component; a clamp turning 0.0 into -0.0 is not one
+            self.wall_hits.append(int((before * world.vel < 0).sum()))
+        return counted
+
+    def _count_contacts(self, world, method):
+        i, j = world._all_pairs
+
+        def counted():
+            delta = world.pos[:, j] - world.pos[:, i]
+            self.contacts.append(int((np.einsum('wkc,wkc->wk', delta, delta) < world._all_pair_distance ** 2).sum()))
+            method()
+        return counted
+
+
+class ProfilerCallback(BaseCallback):
+    """
+    Writes a StepProfiler's phase timings to TensorBoard every log_freq steps.
+
+    Each phase becomes a histogram and a mean scalar under profile/ in the
+    run's TensorBoard directory. The time between two vectorized steps that
+    was not spent inside the timed phases is logged as profile/policy: the
+    policy forward pass plus rollout bookkeeping.
+    """
+
+    def __init__(self, profiler, log_freq=1000, log_dir=None, verbose=0):
+        super(ProfilerCallback, self).__init__(verbose)
+        self.profiler = profiler
+        self.log_freq = log_freq
+        self.log_dir = log_dir
+        self.writer = None
+        self._last = None
+        self._env_ns = 0
+
+    def _on_training_start(self):
+        from stable_baselines3.common.logger import TensorBoardOutputFormat
+
+        # Reuse the run's own event file when there is one
+        for output in self.logger.output_formats:
+            if isinstance(output, TensorBoardOutputFormat):
+                self.writer = output.writer
+        if self.writer is None:
+            from torch.utils.tensorboard import SummaryWriter
+            self.writer = SummaryWriter(self.log_dir)
+
+    def _on_step(self):
+        now = time.perf_counter_ns()
+        env_ns = self.profiler.total_ns
+        if self._last is not None:
+            self.profiler.record('policy', max(0, now - self._last - (env_ns - self._env_ns)))
+        self._last, self._env_ns = now, env_ns
+
+        if self.n_calls % self.log_freq == 0:
+            self._write()
+        return True
+
+    def _on_training_end(self):
+        self._write()
+
+    def _write(self):
+        step = self.num_timesteps
+        for name, values in self.profiler.durations.items():
+            if values:
+                us = np.asarray(values) / 1e3
+                self.writer.add_histogram(f'profile/{name}_us', us, step)
+                self.writer.add_scalar(f'profile/{name}_mean_us', us.mean(), step)
+        for name, values in (('wall_hits', self.profiler.wall_hits), ('contacts', self.profiler.contacts)):
+            if values:
+                self.writer.add_histogram(f'profile/{name}_per_step', np.asarray(values), step)
+        self.writer.flush()
+        self.profiler.clear()
@@ -0,0 +1,147 @@
+import struct
+
+import gym
+import numpy as np
+
+# File layout: a fixed header, then one float32 row per step:
+# obs (obs_dim) | action (action_dim) | reward | done
+MAGIC = b'SSTRAJ01'
+HEADER = struct.Struct('<8sIIQ')  # magic, obs_dim, action_dim, steps
+CHUNK_STEPS = 4096
+READ_CHUNK_STEPS = 65536
+
+
+def _flat_dim(space):
+    return int(np.prod(space.shape)) if space.shape else 1
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """
+    Records every step of a single environment to a compact binary file.
+
+    Each step appends (obs, action, reward, done) to a preallocated float32
+    chunk, where obs is the observation the action was chosen from. Full
+    chunks are appended to the file and the step count in its header is
+    updated, so memory use stays at one chunk however long the recording
+    runs. Read recordings back with TrajectoryReader.
+    """
+
+    def __init__(self, env, path, chunk_steps=CHUNK_STEPS):
+        super(TrajectoryRecorder, self).__init__(env)
+        self.path = path
+        self.obs_dim = _flat_dim(env.observation_space)
+        self.action_dim = _flat_dim(env.action_space)
+        self.row_dim = self.obs_dim + self.action_dim + 2
+        self.steps = 0
+
+        self._chunk = np.empty((chunk_steps, self.row_dim), dtype=np.float32)
+        self._filled = 0
+        self._in_episode = False  # The last recorded step did not end its episode
+        self._last_obs = np.zeros(self.obs_dim, dtype=np.float32)
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, self.obs_dim, self.action_dim, 0))
+
+    def reset(self, **kwargs):
+        if self._in_episode:
+            self._end_episode()
+        obs = self.env.reset(**kwargs)
+        self._last_obs[:] = np.ravel(obs)
+        return obs
+
+    def step(self, action):
+        obs, reward, done, info = self.env.step(action)
+
+        row = self._chunk[self._filled]
+        a = self.obs_dim
+        b = a + self.action_dim
+        row[:a] = self._last_obs
+        row[a:b] = np.ravel(action)
+        row[b] = reward
+        row[b + 1] = done
+        self._filled += 1
+        self.steps += 1
+        self._in_episode = not done
+        if self._filled == len(self._chunk):
+            self.flush()
+
+        self._last_obs[:] = np.ravel(obs)
+        return obs, reward, done, info
+
+    def _end_episode(self):
+        # A reset cuts the episode short: its last step, buffered or already written, becomes its end
+        if self._filled:
+            self._chunk[self._filled - 1, -1] = 1
+        elif self._file is not None:
+            self._file.seek(HEADER.size + (self.steps * self.row_dim - 1) * 4)
+            self._file.write(np.float32(1).tobytes())
+            self._file.seek(0, 2)
+        self._in_episode = False
+
+    def flush(self):
+        """Append the buffered steps to the file and update its header."""
+        if self._file is None:
+            return
+        self._file.write(self._chunk[:self._filled].tobytes())
+        self._filled = 0
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, self.obs_dim, self.action_dim, self.steps))
+        self._file.seek(0, 2)
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.env.close()
+
+
+class TrajectoryReader:
+    """
+    Memory-mapped view of a TrajectoryRecorder file.
+
+    obs, actions, rewards and dones are strided views into the mapped file;
+    nothing is read from disk until they are indexed. episodes() streams one
+    episode at a time and scans the done flags in READ_CHUNK_STEPS blocks, so
+    even very long recordings are read with constant memory.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, self.obs_dim, self.action_dim, self.steps = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a trajectory recording")
+        self.row_dim = self.obs_dim + self.action_dim + 2
+        if self.steps:
+            self.rows = np.memmap(path, dtype=np.float32, mode='r', offset=HEADER.size,
+                                  shape=(self.steps, self.row_dim))
+        else:
+            self.rows = np.empty((0, self.row_dim), dtype=np.float32)
+
+        a = self.obs_dim
+        b = a + self.action_dim
+        self.obs = self.rows[:, :a]
+        self.actions = self.rows[:, a:b]
+        self.rewards = self.rows[:, b]
+        self.dones = self.rows[:, b + 1]
+
+    def __len__(self):
+        return self.steps
+
+    def episode_bounds(self):
+        """Yields (start, stop) step ranges, one per episode; an unfinished last episode is included."""
+        start = 0
+        for block in range(0, self.steps, READ_CHUNK_STEPS):
+            for end in np.flatnonzero(self.dones[block:block + READ_CHUNK_STEPS]) + block + 1:
+                yield start, int(end)
+                start = int(end)
+        if start < self.steps:
+            yield start, self.steps
+
+    def episodes(self):
+        """Yields (obs, actions, rewards, dones) arrays for one episode at a time."""
+        for start, stop in self.episode_bounds():
+            rows = np.array(self.rows[start:stop])
+            a = self.obs_dim
+            b = a + self.action_dim
+            yield rows[:, :a], rows[:, a:b], rows[:, b], rows[:, b + 1].astype(bool)
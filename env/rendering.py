@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pygame
+
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+BLACK = (0, 0, 0)
+
+
+class PitchRenderer:
+    """
+    Draws a DiscWorld onto a pygame surface.
+
+    The static pitch (field, boundary and goals) is drawn once into a
+    background surface and blitted at the start of every frame, so a frame
+    costs one blit plus a circle per disc. Mode 'rgb_array' never opens a
+    window: it runs on the SDL dummy driver and returns (height, width, 3)
+    uint8 frames, which works on machines without a display. With
+    render_every=k only every k-th call draws a new frame; the calls in
+    between return the previous one.
+    """
+
+    def __init__(self, world, player_radius, ball_radius, players_per_side, render_every=1, caption='Soccer Stars AI'):
+        self.world = world
+        self.player_radius = player_radius
+        self.ball_radius = ball_radius
+        self.players_per_side = players_per_side
+        self.render_every = max(1, render_every)
+        self.caption = caption
+        self.size = (world.table.width, world.table.height)
+
+        self.screen = None
+        self.canvas = None
+        self.background = None
+        self.frame = None
+        self._calls = 0
+
+    def render(self, mode='human'):
+        if mode not in ('human', 'rgb_array'):
+            raise ValueError(f"Unsupported render mode {mode!r}")
+        self._setup(mode)
+
+        self._calls += 1
+        if (self._calls - 1) % self.render_every == 0:
+            self._draw()
+            if mode == 'rgb_array':
+                # pixels3d is indexed (x, y); frames are (y, x) like every video tool expects
+                self.frame = np.ascontiguousarray(pygame.surfarray.pixels3d(self.canvas).transpose(1, 0, 2))
+            else:
+                self.screen.blit(self.canvas, (0, 0))
+                pygame.display.flip()
+
+        if mode == 'rgb_array':
+            return self.frame
+
+    def close(self):
+        if self.screen is not None:
+            pygame.display.quit()
+            self.screen = None
+
+    def _setup(self, mode):
+        if self.canvas is None:
+            if mode == 'rgb_array' and not pygame.display.get_init():
+                # Offscreen only: make sure nothing ever asks for a real display
+                os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            pygame.init()
+            self.canvas = pygame.Surface(self.size)
+            self.background = self._draw_pitch()
+        if mode == 'human' and self.screen is None:
+            self.screen = pygame.display.set_mode(self.size)
+            pygame.display.set_caption(self.caption)
+
+    def _draw_pitch(self):
+        t = self.world.table
+        background = pygame.Surface(self.size)
+        background.fill(BLACK)
+        pygame.draw.rect(background, WHITE, (t.boundary_left, t.boundary_top,
+                                             t.boundary_right - t.boundary_left,
+                                             t.boundary_bottom - t.boundary_top), 2)
+        pygame.draw.rect(background, RED, (t.goal_left_x, t.goal_y, t.goal_width, t.goal_height))  # Left goal
+        pygame.draw.rect(background, BLUE, (t.goal_right_x, t.goal_y, t.goal_width, t.goal_height))  # Right goal
+        return background
+
+    def _draw(self):
+        self.canvas.blit(self.background, (0, 0))
+        n = self.players_per_side
+        pos = self.world.pos[0]
+        for x, y in pos[:n]:
+            pygame.draw.circle(self.canvas, BLUE, (int(x), int(y)), self.player_radius)
+        for x, y in pos[n:2 * n]:
+            pygame.draw.circle(self.canvas, RED, (int(x), int(y)), self.player_radius)
+        for x, y in pos[self.world.ball:]:
+            pygame.draw.circle(self.canvas, WHITE, (int(x), int(y)), self.ball_radius)
@@ -0,0 +1,126 @@
+"""
+Worker side of SharedMemoryVecEnv.
+
+Kept apart from env/shared_vec_env.py so worker processes import only
+NumPy and the envs they run, never stable-baselines3 or torch.
+"""
+import pickle
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """Observation ring, rewards, dones, terminal observations and actions in shared memory."""
+
+    def __init__(self, num_envs, obs_shape, action_shape, action_dtype, ring_size, names=None):
+        layout = {
+            'obs': ((ring_size, num_envs) + obs_shape, np.float32),
+            'rewards': ((ring_size, num_envs), np.float32),
+            'dones': ((ring_size, num_envs), np.bool_),
+            'terminal_obs': ((num_envs,) + obs_shape, np.float32),
+            'actions': ((num_envs,) + action_shape, action_dtype),
+        }
+        self.blocks = {}
+        for key, (shape, dtype) in layout.items():
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=names[key])
+            self.blocks[key] = block
+            setattr(self, key, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+    @property
+    def names(self):
+        return {key: block.name for key, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        for key, block in self.blocks.items():
+            setattr(self, key, None)
+            block.close()
+            if unlink:
+                block.unlink()
+
+
+def worker(remote, parent_remote, pickled_env_fns, start, layout):
+    parent_remote.close()
+    envs = [fn() for fn in pickle.loads(pickled_env_fns)]
+    shared = SharedArrays(*layout)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'close':
+                for env in envs:
+                    env.close()
+                remote.send((None, None))
+                break
+            # Replies are (None, result), or (traceback, None) so the parent can raise it
+            try:
+                remote.send((None, _run(cmd, data, envs, start, shared)))
+            except Exception:
+                remote.send((traceback.format_exc(), None))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shared.close()
+
+
+class LocalRemote:
+    """Stands in for a worker's pipe when SharedMemoryVecEnv runs the envs in the calling process."""
+
+    def __init__(self, env_fns, shared):
+        self.envs = [fn() for fn in env_fns]
+        self.shared = shared
+        self._reply = None
+
+    def send(self, message):
+        cmd, data = message
+        if cmd == 'close':
+            for env in self.envs:
+                env.close()
+            self._reply = (None, None)
+            return
+        try:
+            self._reply = (None, _run(cmd, data, self.envs, 0, self.shared))
+        except Exception:
+            self._reply = (traceback.format_exc(), None)
+
+    def recv(self):
+        reply, self._reply = self._reply, None
+        return reply
+
+
+def _run(cmd, data, envs, start, shared):
+    """Carry out one command. The per-env commands get a list of (local slot, data) pairs."""
+    if cmd == 'step':
+        slot = data
+        for k, env in enumerate(envs):
+            i = start + k
+            obs, reward, done, _ = env.step(shared.actions[i])
+            if done:
+                shared.terminal_obs[i] = obs
+                obs = env.reset()
+            shared.obs[slot, i] = obs
+            shared.rewards[slot, i] = reward
+            shared.dones[slot, i] = done
+    elif cmd == 'reset':
+        slot = data
+        for k, env in enumerate(envs):
+            shared.obs[slot, start + k] = env.reset()
+    elif cmd == 'get_attr':
+        return [getattr(envs[k], name) for k, name in data]
+    elif cmd == 'set_attr':
+        for k, (name, value) in data:
+            setattr(envs[k], name, value)
+        return [None] * len(data)
+    elif cmd == 'env_method':
+        return [getattr(envs[k], name)(*args, **kwargs) for k, (name, args, kwargs) in data]
+    elif cmd == 'set_opponent_action':
+        return [envs[k].set_opponent_action(action) for k, action in data]
+    elif cmd == 'seed':
+        # The gym 0.26 envs here have no seed() unless they own a generator
+        return [envs[k].seed(*args) if hasattr(envs[k], 'seed') else None for k, args in data]
+    else:
+        raise ValueError(f"Unknown command {cmd!r}")
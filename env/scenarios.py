@@ -0,0 +1,303 @@
+"""
+Start states beyond the kickoff: practice scenarios and a curriculum over them.
+
+ScenarioSampler places every disc of many worlds in one vectorized call,
+inside the walls and without overlaps, for one of three stages:
+
+- open_goal:      the ball in front of the right goal with the attackers
+                  behind it; every defender is off the goal mouth,
+- one_defender:   the same, but one defender stands between the ball and
+                  the goal,
+- full_formation: the defenders in their kickoff formation, the ball and
+                  the attackers anywhere in the attacking side's reach.
+
+The attackers are world.teams[0] and the goal is the right one, the side
+the envs' +1 reward goes to. Curriculum starts at the first stage and moves
+on once the recent win rate (episodes ending in a +1 goal) reaches
+promote_at.
+"""
+import numpy as np
+
+STAGES = ('open_goal', 'one_defender', 'full_formation')
+MAX_TRIES = 20            # Resampling rounds before a world falls back to the kickoff layout
+FORMATION_JITTER = 30     # Pixels the defenders may stray from their kickoff spots
+PROMOTE_WIN_RATE = 0.6
+EPISODE_WINDOW = 200      # Episodes the win rate is taken over
+MAX_FALLBACK_RATE = 0.005  # check_fallbacks() fails above this share of kickoff fallbacks
+RNG_STATE_SIZE = 10       # PCG64 state and increment as 32-bit words, plus the buffered uint32
+# Curriculum.get_state() layout: sampler generator, stage index, episode count, win window
+CURRICULUM_STATE_SIZE = RNG_STATE_SIZE + 2 + EPISODE_WINDOW
+
+
+def pack_rng(rng, out):
+    """Write a PCG64 generator's state into `out` as float64 values, every one exactly representable."""
+    state = rng.bit_generator.state
+    for k, value in enumerate((state['state']['state'], state['state']['inc'])):
+        for word in range(4):
+            out[4 * k + word] = (value >> (32 * word)) & 0xFFFFFFFF
+    out[8], out[9] = state['has_uint32'], state['uinteger']
+    return out
+
+
+def unpack_rng(values):
+    """The generator whose state pack_rng() wrote into `values`."""
+    words = [int(v) for v in values]
+    state, inc = (sum(words[4 * k + word] << (32 * word) for word in range(4)) for k in range(2))
+    rng = np.random.default_rng()
+    rng.bit_generator.state = {'bit_generator': 'PCG64', 'state': {'state': state, 'inc': inc},
+                               'has_uint32': words[8], 'uinteger': words[9]}
+    return rng
+
+
+class ScenarioSampler:
+    """
+    Vectorized start states for a DiscWorld.
+
+    kickoff holds the players' kickoff positions, used for the formation
+    stage and as the fallback layout. fixed_x keeps every player on its
+    kickoff x, for air hockey paddles that only move vertically: each
+    team is then spread along its lines and the balls start between them.
+    ball_speed sends the balls off towards the right goal mouth at that
+    speed, so they reach paddles that cannot come to them.
+    """
+
+    def __init__(self, world, kickoff, fixed_x=False, ball_speed=0.0, seed=None, max_tries=MAX_TRIES):
+        self.world = world
+        self.kickoff = np.asarray(kickoff, dtype=np.float32)
+        self.fixed_x = fixed_x
+        self.ball_speed = ball_speed
+        self.max_tries = max_tries
+        self.rng = np.random.default_rng(seed)
+        self.fallbacks = 0  # Worlds that fell back to the kickoff layout so far
+
+        t = world.table
+        self.clearance = world.wall_radius
+        self.left, self.right = t.boundary_left + self.clearance, t.boundary_right - self.clearance
+        self.top, self.bottom = t.boundary_top + self.clearance, t.boundary_bottom - self.clearance
+        self.mouth = (t.goal_y, t.goal_y + t.goal_height)
+        self.attackers = np.asarray(world.teams[0], dtype=np.intp)
+        self.defenders = np.asarray(world.teams[1], dtype=np.intp)
+        self.balls = np.arange(world.ball, world.num_bodies)
+        self._touch = world.radius[:, None] + world.radius[None, :]
+        np.fill_diagonal(self._touch, 0)
+        # Overlaps are fixed by moving the later disc: balls first, then defenders, then attackers
+        rank = np.empty(world.num_bodies, dtype=np.intp)
+        rank[np.concatenate([self.balls, self.defenders, self.attackers])] = np.arange(world.num_bodies)
+        self._earlier = rank[None, :] < rank[:, None]
+        # Teams on fixed x lines are stacked as a whole (see _stacked), so they are placed again as a whole
+        self._groups = (self.attackers, self.defenders) if fixed_x else ()
+        # Balls placed anywhere keep clear of those x lines, where no gap is sure to be left for them
+        self._ball_x = (self.left, self.right)
+        if fixed_x:
+            touch = world.radius[:world.num_players].max() + world.radius[self.balls].max()
+            lines = self.kickoff[:, 0]
+            self._ball_x = (max(self.left, lines.min() + touch), min(self.right, lines.max() - touch))
+
+    def sample(self, count, stage='full_formation'):
+        """Positions of every body for `count` worlds, shape (count, num_bodies, 2)."""
+        pos = self._place(count, stage)
+        todo = np.arange(count)
+        for attempt in range(self.max_tries):
+            moved = self._overlapping(pos[todo])
+            todo, moved = todo[moved.any(axis=1)], moved[moved.any(axis=1)]
+            if not len(todo):
+                return pos
+            if attempt < self.max_tries // 2:
+                # Only the discs in the way are placed again; the first ball stays where it is
+                for group in self._groups:
+                    moved[:, group] |= moved[:, group].any(axis=1, keepdims=True)
+                fresh = self._place(len(todo), stage, ball=pos[todo, self.world.ball])
+                pos[todo] = np.where(moved[..., None], fresh, pos[todo])
+            else:
+                # The ball may leave no room where it is: start those worlds over
+                pos[todo] = self._place(len(todo), stage)
+        todo = todo[self._overlapping(pos[todo]).any(axis=1)]
+        self.fallbacks += len(todo)
+        # The few worlds still overlapping start from the kickoff
+        pos[todo, :self.world.num_players] = self.kickoff
+        spacing = np.arange(1, self.world.num_balls + 1) / (self.world.num_balls + 1)
+        pos[todo, self.world.ball:, 0] = self.world.table.width // 2
+        pos[todo, self.world.ball:, 1] = self.world.table.height * spacing
+        return pos
+
+    def apply(self, stage, mask=None):
+        """Sample `stage` into the worlds in `mask` (all by default) and stop every disc there."""
+        worlds = np.arange(self.world.num_worlds) if mask is None else np.flatnonzero(mask)
+        pos = self.sample(len(worlds), stage)
+        self.world.pos[worlds] = pos
+        self.world.vel[worlds] = 0
+        if self.ball_speed:
+            top, bottom = self.mouth
+            aim_y = self._uniform(top, bottom, (len(worlds), len(self.balls)))
+            aim = np.stack([np.full_like(aim_y, self.world.table.goal_right_x), aim_y], axis=-1) - pos[:, self.balls]
+            aim /= np.maximum(np.hypot(aim[..., 0], aim[..., 1]), 1e-6)[..., None]
+            self.world.vel[worlds[:, None], self.balls] = self.ball_speed * aim
+
+    def _uniform(self, low, high, shape):
+        return low + (high - low) * self.rng.random(shape, dtype=np.float32)
+
+    def _place(self, n, stage, ball=None):
+        pos = np.empty((n, self.world.num_bodies, 2), dtype=np.float32)
+        mid_x = self.world.table.width / 2
+        top, bottom = self.mouth
+        players = self.world.num_players
+
+        if stage == 'full_formation':
+            ball_x = self._uniform(*self._ball_x, (n, len(self.balls)))
+            ball_y = self._uniform(self.top, self.bottom, (n, len(self.balls)))
+        else:
+            ball_x = self._uniform(mid_x, self.right - 150, (n, len(self.balls)))
+            ball_y = self._uniform(top - 50, bottom + 50, (n, len(self.balls)))
+        if ball is not None:
+            ball_x[:, 0], ball_y[:, 0] = ball[:, 0], ball[:, 1]
+        pos[:, self.balls, 0], pos[:, self.balls, 1] = ball_x, ball_y
+
+        # Attackers somewhere behind the (first) ball, ready to shoot towards the right goal
+        behind = np.maximum(ball_x[:, :1] - 2 * self.clearance, self.left + 1)
+        pos[:, self.attackers, 0] = self._uniform(self.left, behind, (n, len(self.attackers)))
+        if self.fixed_x:
+            # They all stand on their kickoff x, so they are spread along it a touch apart
+            pos[:, self.attackers, 1] = self._stacked(n, self.attackers, [(self.top, self.bottom)])
+        else:
+            pos[:, self.attackers, 1] = self._uniform(self.top, self.bottom, (n, len(self.attackers)))
+
+        if stage == 'full_formation':
+            pos[:, self.defenders] = self.kickoff[self.defenders] + self._uniform(
+                -FORMATION_JITTER, FORMATION_JITTER, (n, len(self.defenders), 2))
+        else:
+            # Above or below the goal mouth, so the way to the goal is open
+            away = self.defenders if stage == 'open_goal' else self.defenders[1:]
+            pos[:, away, 0] = self._uniform(mid_x, self.right, (n, len(away)))
+            bands = [(self.top, max(top - self.clearance, self.top + 1)),
+                     (min(bottom + self.clearance, self.bottom - 1), self.bottom)]
+            pos[:, away, 1] = self._stacked(n, away, bands)
+            if stage == 'one_defender':
+                keeper = self.defenders[0]
+                pos[:, keeper, 0] = self._uniform(ball_x[:, 0] + 2 * self.clearance, self.right, n)
+                pos[:, keeper, 1] = self._uniform(top, bottom, n)
+
+        if self.fixed_x:
+            pos[:, :players, 0] = self.kickoff[:, 0]
+        pos[..., 0] = np.clip(pos[..., 0], self.left, self.right)
+        pos[..., 1] = np.clip(pos[..., 1], self.top, self.bottom)
+        return pos
+
+    def _stacked(self, n, discs, bands):
+        """
+        y values inside the (low, high) `bands` for `discs`, shape (n, len(discs)).
+
+        The discs are dealt in a random order round the bands, so they hold
+        as even a share as possible, and the discs sharing a band get slots
+        a touch apart: paddles on one kickoff x could not pass each other
+        otherwise.
+        """
+        k, b = len(discs), len(bands)
+        bands = np.asarray(bands, dtype=np.float32)
+        order = self.rng.permuted(np.tile(np.arange(k), (n, 1)), axis=1)
+        band = (order + self.rng.integers(b, size=(n, 1))) % b
+        count = (k - order % b + b - 1) // b  # Discs in the same band
+        rank = order // b                     # Slot within that band
+
+        gap = 2 * self.world.radius[discs].max(initial=0)
+        low, high = bands[band, 0], bands[band, 1]
+        slot = np.maximum(high - low - (count - 1) * gap, 0) / count
+        return low + rank * (gap + slot) + slot * self.rng.random((n, k), dtype=np.float32)
+
+    def _overlapping(self, pos):
+        """(worlds, bodies) mask of the discs that overlap a disc placed before them."""
+        delta = pos[:, :, None] - pos[:, None, :]
+        distance = np.hypot(delta[..., 0], delta[..., 1])
+        return ((distance < self._touch) & self._earlier).any(axis=2)
+
+
+class Curriculum:
+    """
+    Steps through STAGES as the agent gets better.
+
+    The envs call reset(mask) where they would put worlds back to kickoff
+    and record(goals) with the goal results of finished episodes. Once
+    `window` episodes are in and the share won reaches promote_at, the next
+    stage starts with a fresh window.
+    """
+
+    def __init__(self, sampler, stages=STAGES, promote_at=PROMOTE_WIN_RATE, window=EPISODE_WINDOW, verbose=0):
+        self.sampler = sampler
+        self.stages = stages
+        self.promote_at = promote_at
+        self.window = window
+        self.verbose = verbose
+        self.level = 0
+        self._wins = np.zeros(window, dtype=bool)
+        self._episodes = 0
+
+    @property
+    def stage(self):
+        return self.stages[self.level]
+
+    @property
+    def state_size(self):
+        return RNG_STATE_SIZE + 2 + self.window
+
+    @property
+    def win_rate(self):
+        n = min(self._episodes, self.window)
+        return self._wins[:n].mean() if n else 0.0
+
+    def reset(self, mask=None):
+        self.sampler.apply(self.stage, mask)
+
+    def record(self, goals):
+        """Count finished episodes by their goal result (+1 is a win)."""
+        goals = np.atleast_1d(goals)
+        slots = (self._episodes + np.arange(len(goals))) % self.window
+        self._wins[slots] = goals > 0
+        self._episodes += len(goals)
+        if self._episodes >= self.window and self.win_rate >= self.promote_at and self.level + 1 < len(self.stages):
+            self.level += 1
+            self._episodes = 0
+            if self.verbose:
+                print(f"Curriculum: moving on to {self.stage}")
+
+    def get_state(self, out=None):
+        """Everything a replay needs as float64 values: the sampler's generator, the stage and the win window."""
+        state = np.empty(self.state_size) if out is None else out
+        pack_rng(self.sampler.rng, state[:RNG_STATE_SIZE])
+        state[RNG_STATE_SIZE], state[RNG_STATE_SIZE + 1] = self.level, self._episodes
+        state[RNG_STATE_SIZE + 2:] = self._wins
+        return state
+
+    def set_state(self, state):
+        self.sampler.rng = unpack_rng(state[:RNG_STATE_SIZE])
+        self.level, self._episodes = int(state[RNG_STATE_SIZE]), int(state[RNG_STATE_SIZE + 1])
+        self._wins[:] = state[RNG_STATE_SIZE + 2:] != 0
+
+
+def check_fallbacks(count=10000, seed=0, max_rate=MAX_FALLBACK_RATE):
+    """
+    Sample every stage for both games and fail if too many worlds fall back to the kickoff layout.
+
+    Returns the worst fallback rate seen.
+    """
+    from env import air_hockey_env, soccer_stars_env
+
+    samplers = {'air_hockey': ScenarioSampler(air_hockey_env.make_world(), air_hockey_env.KICKOFF_POSITIONS,
+                                              fixed_x=True, seed=seed)}
+    for players in (1, 3, 5):
+        samplers[f'soccer_stars_{players}v{players}'] = ScenarioSampler(
+            soccer_stars_env.make_world(players), soccer_stars_env.kickoff_positions(players), seed=seed)
+
+    worst = 0.0
+    for name, sampler in samplers.items():
+        for stage in STAGES:
+            sampler.fallbacks = 0
+            sampler.sample(count, stage)
+            rate = sampler.fallbacks / count
+            print(f"{name:>20} {stage:>14}: {100 * rate:.2f}% fell back to the kickoff")
+            if rate > max_rate:
+                raise AssertionError(f"{name} {stage}: {100 * rate:.2f}% fallbacks, over {100 * max_rate:.2f}%")
+            worst = max(worst, rate)
+    return worst
+
+
+if __name__ == '__main__':
+    print(f"Worst fallback rate {100 * check_fallbacks():.2f}%")
@@ -0,0 +1,186 @@
+"""
+Dense, potential-based reward shaping for the air hockey and Soccer Stars environments.
+
+Goals only pay +1/-1, so most steps of a rollout carry no reward at all.
+The shaping adds gamma * phi(s') - phi(s) every step, where phi rates the
+position for the side the +1 goes to (the ball entering the right goal):
+
+- ball-to-goal distance: how close the ball is to the right goal mouth,
+- goal-mouth coverage: how much of that mouth the discs guarding it hide
+  from the ball (lowers phi),
+- shot-lane openness: how clear the straight line from the ball to the
+  goal centre is of every player disc.
+
+Being a potential difference, it leaves the best policy unchanged (Ng et
+al., 1999); phi is 0 once an episode ends. Everything that only depends on
+where the ball is (distance, the angles to both posts, the lane to the goal
+centre) is looked up in grids computed once per field geometry and cached
+to .npz files, so a step costs a few array lookups for every world at once.
+With numba installed the per-disc terms run in the compiled kernel from
+env/kernels.py, which keeps small batches from paying NumPy's per-call
+overhead a dozen times a step.
+"""
+import os
+
+import numpy as np
+
+from env import kernels
+
+GRID_CELL = 4  # Pixels per grid cell
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'shaping')
+GAMMA = 0.99  # PPO's default discount
+
+# Weights of the three terms in phi, small next to the +1/-1 of a goal
+GOAL_DISTANCE_WEIGHT = 0.1
+COVERAGE_WEIGHT = 0.05
+LANE_WEIGHT = 0.05
+
+_grids = {}  # In-memory copies, shared by every env of the process
+
+
+def _cache_key(table, cell):
+    return (table.width, table.height, table.goal_y, table.goal_height,
+            table.boundary_left, table.boundary_right, cell)
+
+
+def compute_grids(table, cell=GRID_CELL):
+    """
+    The ball-position lookup grids for `table`, each indexed [y // cell, x // cell].
+
+    distance:    1 at the right goal mouth, falling to 0 a field diagonal away.
+    post_angles: angles from the cell to the top and bottom right goal posts.
+    lane:        unit direction and length from the cell to the right goal centre.
+    """
+    rows, cols = -(-table.height // cell), -(-table.width // cell)
+    y, x = np.mgrid[0:rows, 0:cols].astype(np.float64)
+    x, y = (x + 0.5) * cell, (y + 0.5) * cell
+
+    goal_x = table.goal_right_x
+    top, bottom = table.goal_y, table.goal_y + table.goal_height
+    mouth_y = np.clip(y, top, bottom)
+    diagonal = np.hypot(table.width, table.height)
+    distance = 1 - np.hypot(goal_x - x, mouth_y - y) / diagonal
+
+    # Cells on or past the goal line see the posts from just in front of it
+    dx = np.maximum(goal_x - x, 1.0)
+    post_angles = np.stack([np.arctan2(top - y, dx), np.arctan2(bottom - y, dx)], axis=-1)
+
+    to_centre_y = table.goal_y + table.goal_height / 2 - y
+    length = np.hypot(dx, to_centre_y)
+    lane = np.stack([dx / length, to_centre_y / length, length], axis=-1)
+
+    return {'distance': distance.astype(np.float32), 'post_angles': post_angles.astype(np.float32),
+            'lane': lane.astype(np.float32)}
+
+
+def load_grids(table, cell=GRID_CELL, cache_dir=CACHE_DIR):
+    """compute_grids(table) from memory, the disk cache, or computed and cached on first use."""
+    key = _cache_key(table, cell)
+    if key in _grids:
+        return _grids[key]
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, 'shaping_{}x{}_goal{}+{}_x{}-{}_cell{}.npz'.format(*key))
+    if path is not None and os.path.exists(path):
+        with np.load(path) as f:
+            grids = {name: f[name] for name in f.files}
+    else:
+        grids = compute_grids(table, cell)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(path, **grids)
+    _grids[key] = grids
+    return grids
+
+
+class PotentialShaping:
+    """
+    Shaping rewards for every world of a DiscWorld.
+
+    The envs call reset(mask) after putting worlds back to kickoff and add
+    step(dones) to their rewards after each step. The first ball is the one
+    that counts on multi-ball pitches; the discs of world.teams[1] guard the
+    right goal. backend is 'auto' (the compiled kernel when numba is
+    installed) or 'numpy', as for DiscWorld.
+    """
+
+    def __init__(self, world, gamma=GAMMA, goal_distance_weight=GOAL_DISTANCE_WEIGHT,
+                 coverage_weight=COVERAGE_WEIGHT, lane_weight=LANE_WEIGHT, cell=GRID_CELL, cache_dir=CACHE_DIR,
+                 backend='auto'):
+        self.world = world
+        self.gamma = gamma
+        self.weights = (goal_distance_weight, coverage_weight, lane_weight)
+        self.cell = cell
+        grids = load_grids(world.table, cell, cache_dir)
+        self.distance, self.post_angles, self.lane = grids['distance'], grids['post_angles'], grids['lane']
+        self.max_row, self.max_col = self.distance.shape[0] - 1, self.distance.shape[1] - 1
+
+        self.defenders = np.asarray(world.teams[1], dtype=np.intp)
+        self.players = np.arange(world.num_players)
+        self._defender_reach = world.radius[self.defenders]
+        self._lane_clearance = world.radius[self.players] + world.radius[world.ball]
+
+        self.kernel = None
+        if backend == 'auto' and kernels.load() is not None:
+            self.kernel = kernels.shaping_potential
+            # One row of (distance, low, high, dir_x, dir_y, length) per cell for the kernel
+            self._lookup = np.concatenate([self.distance[..., None], self.post_angles, self.lane], axis=-1)
+            self._weights = np.asarray(self.weights, dtype=np.float64)
+            self._phi = np.empty(world.num_worlds, dtype=np.float32)
+
+        self.last = np.zeros(world.num_worlds, dtype=np.float32)  # phi after the previous step, per world
+        self._shaping = np.empty(world.num_worlds, dtype=np.float32)
+        self.reset()
+
+    def potential(self):
+        """phi of the current position, one value per world."""
+        world = self.world
+        if self.kernel is not None:
+            self.kernel(world.pos, world.ball, self.defenders, self._defender_reach, self._lane_clearance,
+                        self._lookup, float(self.cell), self._weights, self._phi)
+            return self._phi
+
+        ball = world.pos[:, world.ball]
+        col = np.clip((ball[:, 0] // self.cell).astype(np.intp), 0, self.max_col)
+        row = np.clip((ball[:, 1] // self.cell).astype(np.intp), 0, self.max_row)
+        w_goal, w_cover, w_lane = self.weights
+
+        phi = w_goal * self.distance[row, col]
+
+        if w_cover:
+            # Each guarding disc hides an arc of half-width asin(r / d) as seen from the ball
+            low, high = self.post_angles[row, col, 0], self.post_angles[row, col, 1]
+            rel = world.pos[:, self.defenders] - ball[:, None]
+            dist = np.maximum(np.hypot(rel[..., 0], rel[..., 1]), 1e-6)
+            angle = np.arctan2(rel[..., 1], rel[..., 0])
+            half = np.arcsin(np.minimum(self._defender_reach / dist, 1))
+            hidden = np.minimum(angle + half, high[:, None]) - np.maximum(angle - half, low[:, None])
+            mouth = np.maximum(high - low, 1e-6)
+            phi -= w_cover * np.minimum(np.maximum(hidden, 0).sum(axis=1) / mouth, 1)
+
+        if w_lane:
+            # Gap between the ball's path to the goal centre and the closest disc, as a fraction of a touch
+            direction, length = self.lane[row, col, :2], self.lane[row, col, 2]
+            rel = world.pos[:, self.players] - ball[:, None]
+            along = np.clip((rel * direction[:, None]).sum(axis=2), 0, length[:, None])
+            offset = rel - along[..., None] * direction[:, None]
+            gap = np.hypot(offset[..., 0], offset[..., 1]) - self._lane_clearance
+            phi += w_lane * np.clip(gap / self._lane_clearance, 0, 1).min(axis=1)
+
+        return phi.astype(np.float32, copy=False)
+
+    def reset(self, mask=None):
+        """Start the potential over for the worlds in `mask` (all by default)."""
+        if mask is None:
+            self.last[:] = self.potential()
+        else:
+            self.last[mask] = self.potential()[mask]
+
+    def step(self, dones):
+        """gamma * phi(s') - phi(s) per world; finished worlds end at phi = 0."""
+        phi = self.potential()
+        np.multiply(self.gamma, np.where(dones, 0, phi), out=self._shaping)
+        self._shaping -= self.last
+        self.last[:] = phi
+        return self._shaping
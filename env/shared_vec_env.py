@@ -0,0 +1,192 @@
+import multiprocessing as mp
+
+import cloudpickle
+import gymnasium
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from env.rollout_worker import LocalRemote, SharedArrays, worker
+
+# Steps kept in the ring before a slot is overwritten
+RING_SIZE = 4
+
+
+def to_gymnasium(space):
+    """The gymnasium version of a gym 0.26 space; stable-baselines3 2.x only accepts gymnasium spaces."""
+    if isinstance(space, gymnasium.Space):
+        return space
+    name = type(space).__name__
+    if name == 'Box':
+        return spaces.Box(space.low, space.high, space.shape, space.dtype)
+    if name == 'MultiDiscrete':
+        return spaces.MultiDiscrete(space.nvec)
+    if name == 'Discrete':
+        return spaces.Discrete(space.n)
+    if name == 'MultiBinary':
+        return spaces.MultiBinary(space.n)
+    raise NotImplementedError(f"No gymnasium counterpart for {space}")
+
+
+def _action_dtype(action_space):
+    if isinstance(action_space, (spaces.Discrete, spaces.MultiDiscrete, spaces.MultiBinary)):
+        return np.int64
+    return np.float32
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Runs environments in worker processes that write straight into shared memory.
+
+    The envs are split into contiguous slices, one per worker. Actions,
+    observations, rewards and dones live in shared arrays, so the pipes only
+    carry a tiny command per step instead of pickled observations. Observations
+    go into a ring of RING_SIZE slots and step() returns a view of the current
+    slot, which stays valid until the ring wraps around.
+
+    num_workers=0 runs every env in the calling process instead, through
+    the same commands, for single-process training and debugging.
+    """
+
+    def __init__(self, env_fns, num_workers=None, ring_size=RING_SIZE, start_method=None):
+        num_envs = len(env_fns)
+        num_workers = min(mp.cpu_count() if num_workers is None else num_workers, num_envs)
+
+        probe = env_fns[0]()
+        observation_space, action_space = to_gymnasium(probe.observation_space), to_gymnasium(probe.action_space)
+        probe.close()
+        super(SharedMemoryVecEnv, self).__init__(num_envs, observation_space, action_space)
+
+        self.ring_size = ring_size
+        self._slot = 0
+        self._layout = (
+            num_envs, observation_space.shape, action_space.shape,
+            _action_dtype(action_space), ring_size,
+        )
+        self._shared = SharedArrays(*self._layout)
+        self.waiting = False
+        self.closed = False
+
+        if num_workers == 0:
+            self.worker_slices = [slice(0, num_envs)]
+            self.remotes, self.processes = [LocalRemote(env_fns, self._shared)], []
+            return
+
+        if start_method is None:
+            # Fork is not thread-safe, prefer forkserver like SubprocVecEnv does
+            start_method = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+        ctx = mp.get_context(start_method)
+        if start_method == 'forkserver':
+            # The fork server imports the light worker module once; workers fork from it ready to go
+            ctx.set_forkserver_preload(['env.rollout_worker'])
+
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self.worker_slices = [slice(bounds[w], bounds[w + 1]) for w in range(num_workers)]
+        self.remotes, self.processes = [], []
+        for worker_slice in self.worker_slices:
+            remote, work_remote = ctx.Pipe()
+            args = (
+                work_remote, remote,
+                cloudpickle.dumps(env_fns[worker_slice]),
+                worker_slice.start,
+                self._layout + (self._shared.names,),
+            )
+            process = ctx.Process(target=worker, args=args, daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+    def reset(self):
+        self._slot = (self._slot + 1) % self.ring_size
+        for remote in self.remotes:
+            remote.send(('reset', self._slot))
+        for remote in self.remotes:
+            _recv(remote)
+        return self._shared.obs[self._slot]
+
+    def step_async(self, actions):
+        self._shared.actions[:] = np.asarray(actions).reshape(self._shared.actions.shape)
+        self._slot = (self._slot + 1) % self.ring_size
+        for remote in self.remotes:
+            remote.send(('step', self._slot))
+        self.waiting = True
+
+    def step_wait(self):
+        try:
+            for remote in self.remotes:
+                _recv(remote)
+        finally:
+            self.waiting = False
+
+        dones = self._shared.dones[self._slot]
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(dones):
+            infos[i]['terminal_observation'] = self._shared.terminal_obs[i].copy()
+        return self._shared.obs[self._slot], self._shared.rewards[self._slot], dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for remote in self.remotes:
+            remote.recv()
+        for process in self.processes:
+            process.join()
+        self._shared.close(unlink=True)
+        self.closed = True
+
+    def seed(self, seed=None):
+        """Seed env i with seed + i through its seed() method; the gym 0.26 envs reseed nothing else."""
+        seeds = super(SharedMemoryVecEnv, self).seed(seed)
+        self._gather('seed', lambda k, i: (seeds[i],), None)
+        return seeds
+
+    def set_opponent_actions(self, actions):
+        """Every env's opponent action in one command per worker, one row per env."""
+        actions = None if actions is None else np.asarray(actions).reshape(self.num_envs, -1)
+        self._gather('set_opponent_action', lambda k, i: None if actions is None else actions[i], None)
+
+    def get_attr(self, attr_name, indices=None):
+        return self._gather('get_attr', lambda k, i: attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._gather('set_attr', lambda k, i: (attr_name, value), indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._gather('env_method', lambda k, i: (method_name, method_args, method_kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def _gather(self, cmd, payload, indices):
+        """
+        Send `cmd` only to the workers owning `indices`, with (local slot, payload) pairs for their envs.
+
+        payload(k, i) builds the data for global env i at position k of
+        indices. Results come back in the order of indices.
+        """
+        indices = list(self._get_indices(indices))
+        jobs = {}
+        for k, i in enumerate(indices):
+            w = np.searchsorted([s.stop for s in self.worker_slices], i, side='right')
+            jobs.setdefault(w, []).append((k, i - self.worker_slices[w].start, payload(k, i)))
+        for w, items in jobs.items():
+            self.remotes[w].send((cmd, [(slot, data) for _, slot, data in items]))
+        results = [None] * len(indices)
+        for w, items in jobs.items():
+            for (k, _, _), result in zip(items, _recv(self.remotes[w])):
+                results[k] = result
+        return results
+
+
+def _recv(remote):
+    """A worker's reply, with the worker's exception raised here if the command failed."""
+    error, result = remote.recv()
+    if error is not None:
+        raise RuntimeError(f"Rollout worker failed:\n{error}")
+    return result
@@ -1,23 +1,127 @@
 import gym
 from gym import spaces
 import numpy as np
-import math
-import pygame
+
+from env.physics import SOCCER_STARS_TABLE, DiscWorld
+from env.scenarios import CURRICULUM_STATE_SIZE, Curriculum, ScenarioSampler
+from env.shaping import PotentialShaping
+
+WIDTH, HEIGHT = 800, 400
+PLAYER_RADIUS = 20
+BALL_RADIUS = 15
+FRICTION = 0.98
+MAX_SPEED = 5  # Velocity applied every tick in the default mode
+MAX_SHOT_SPEED = 15  # One flick in turn-based mode, about 750px of travel
+
+
+def kickoff_formation(players_per_side, width, height):
+    """Team 1 kickoff spots in columns of up to three discs, starting 100px from its goal line."""
+    spots = []
+    for k in range(players_per_side):
+        column, row = divmod(k, 3)
+        rows = min(3, players_per_side - 3 * column)
+        spots.append((100 + 90 * column, height * (row + 1) // (rows + 1)))
+    return np.array(spots, dtype=np.float32)
+
+
+def kickoff_positions(players_per_side, width=WIDTH, height=HEIGHT):
+    """Both teams' kickoff spots, (2 * players_per_side, 2): team 2 mirrors team 1."""
+    team1 = kickoff_formation(players_per_side, width, height)
+    team2 = team1.copy()
+    team2[:, 0] = width - team1[:, 0]
+    return np.concatenate([team1, team2])
+
+
+def mirror_obs(obs, players_per_side, out=None):
+    """
+    Observations as seen from team 2: the pitch flipped left to right and the team blocks swapped.
+
+    A policy trained as player 1 can then play player 2 from the result;
+    its (angle, force) action maps back with mirror_action.
+    """
+    obs = np.asarray(obs)
+    if out is None:
+        out = np.empty_like(obs)
+    block = 4 * players_per_side
+    out[..., :block] = obs[..., block:2 * block]
+    out[..., block:2 * block] = obs[..., :block]
+    out[..., 2 * block:] = obs[..., 2 * block:]
+    out[..., 0::4] = WIDTH - out[..., 0::4]
+    out[..., 2::4] = -out[..., 2::4]
+    return out
+
+
+def mirror_action(action):
+    """Flip (angle, force) actions from the mirrored pitch back onto the real one."""
+    action = np.array(action, dtype=np.float32)
+    action[..., 0] = (180 - action[..., 0]) % 360
+    return action
+
+
+def make_world(players_per_side=1, num_balls=1, num_worlds=1, **kwargs):
+    """
+    Both teams and the balls on the Soccer Stars pitch.
+
+    Players and balls run on the same disc physics as the air hockey game.
+    Full formations and multi-ball drills switch it to the broad phase.
+    """
+    num_bodies = 2 * players_per_side + num_balls
+    return DiscWorld(
+        SOCCER_STARS_TABLE,
+        radius=[PLAYER_RADIUS] * (2 * players_per_side) + [BALL_RADIUS] * num_balls,
+        friction=[FRICTION] * num_bodies,
+        teams=(list(range(players_per_side)), list(range(players_per_side, 2 * players_per_side))),
+        num_worlds=num_worlds,
+        wall_radius=PLAYER_RADIUS,
+        num_balls=num_balls,
+        **kwargs,
+    )
+
+
+def get_obs(world, out):
+    """
+    Write (x, y, vx, vy) per body for every world into `out`, shape (num_worlds, 4 * num_bodies).
+
+    Nothing is allocated, `out` is filled in place through strided views.
+    """
+    out[:, 0::4] = world.pos[..., 0]
+    out[:, 1::4] = world.pos[..., 1]
+    out[:, 2::4] = world.vel[..., 0]
+    out[:, 3::4] = world.vel[..., 1]
+    return out
+
 
 class SoccerStarsEnv(gym.Env):
-    def __init__(self):
+    metadata = {'render.modes': ['human', 'rgb_array']}
+
+    def __init__(self, players_per_side=1, num_balls=1, turn_based=False, copy_obs=False, render_every=1,
+                 reward_shaping=False, curriculum=False):
+        """
+        Observations are written into one preallocated float32 buffer that is
+        reused every step; pass copy_obs=True to get an independent array.
+        render_every=k makes render() draw only every k-th call.
+        reward_shaping=True adds the dense potential-based terms of
+        env/shaping.py to the goal rewards. curriculum=True starts episodes
+        from the practice scenarios of env/scenarios.py instead of the kickoff.
+        """
         super(SoccerStarsEnv, self).__init__()
         
         # Environment constants
-        self.WIDTH = 800
-        self.HEIGHT = 400
-        self.PLAYER_RADIUS = 20
-        self.BALL_RADIUS = 15
+        self.WIDTH = WIDTH
+        self.HEIGHT = HEIGHT
+        self.PLAYER_RADIUS = PLAYER_RADIUS
+        self.BALL_RADIUS = BALL_RADIUS
+        self.MAX_SPEED = MAX_SPEED
+        self.MAX_SHOT_SPEED = MAX_SHOT_SPEED
+        self.turn_based = turn_based
+        self.players_per_side = players_per_side
+        self.num_balls = num_balls
+        num_bodies = 2 * players_per_side + num_balls
 
         self.observation_space = spaces.Box(
             low=0,
             high=max(self.WIDTH, self.HEIGHT),
-            shape=(12,),  # 2 players x (x, y, vx, vy) + ball (x, y, vx, vy)
+            shape=(4 * num_bodies,),  # (x, y, vx, vy) per player, team 1 then team 2, then per ball
             dtype=np.float32
         )
 
@@ -27,96 +131,135 @@ class SoccerStarsEnv(gym.Env):
             dtype=np.float32
         )
 
+        self.world = make_world(players_per_side, num_balls)
+        self.kickoff = kickoff_positions(players_per_side, self.WIDTH, self.HEIGHT)
+
+        # Player 1 is the disc the agent shoots with, player 2 the first opponent
+        self.player1_pos, self.player1_vel = self.world.pos[0, 0], self.world.vel[0, 0]
+        self.player2_pos, self.player2_vel = self.world.pos[0, players_per_side], self.world.vel[0, players_per_side]
+        self.ball_pos, self.ball_vel = self.world.pos[0, self.world.ball], self.world.vel[0, self.world.ball]
+
+        self.copy_obs = copy_obs
+        self._obs = np.empty((1, 4 * num_bodies), dtype=np.float32)
+        self.state_size = self.world.state_size + 1 + CURRICULUM_STATE_SIZE  # Physics, shaping potential, curriculum
+        self.opponent_action = None  # Player 2's (angle, force), see set_opponent_action
+        self.render_every = render_every
+        self.renderer = None
+        self.shaping = PotentialShaping(self.world) if reward_shaping else None
+        self.curriculum = Curriculum(ScenarioSampler(self.world, self.kickoff)) if curriculum else None
+
         self.reset()
 
     def reset(self):
-        # Randomize positions for the two players and the ball
-        self.player1_pos = [100, self.HEIGHT // 2]
-        self.player2_pos = [self.WIDTH - 100, self.HEIGHT // 2]
-        self.ball_pos = [self.WIDTH // 2, self.HEIGHT // 2]
-
-        self.player1_vel = [0, 0]
-        self.player2_vel = [0, 0]
-        self.ball_vel = [0, 0]
+        if self.curriculum is not None:
+            self.curriculum.reset()
+        else:
+            self.world.pos[0, :self.world.num_players] = self.kickoff
+            self.world.vel[:] = 0
+            self.world.reset_ball()
+        if self.shaping is not None:
+            self.shaping.reset()
 
         return self._get_obs()
 
     def step(self, action):
-        """ Takes an action for player 1 and updates the environment. """
+        """
+        Takes an action for player 1 and updates the environment.
+
+        By default the action sets player 1's velocity and the world advances
+        one tick. With turn_based=True the action is a single flick and the
+        shot is simulated until every disc stops or a goal is scored.
+        """
         
         # Unpack action (angle, force)
         angle, force = action
         angle_rad = np.radians(angle)
+        speed = self.MAX_SHOT_SPEED if self.turn_based else self.MAX_SPEED
 
          # Apply force to player 1's velocity
-        self.player1_vel[0] = force * np.cos(angle_rad) * 5  # 5 = max speed multiplier
-        self.player1_vel[1] = force * np.sin(angle_rad) * 5
+        self.player1_vel[0] = force * np.cos(angle_rad) * speed
+        self.player1_vel[1] = force * np.sin(angle_rad) * speed
 
-        # Update player positions and ball position
-        self._update_position(self.player1_pos, self.player1_vel)
-        self._update_position(self.player2_pos, self.player2_vel)
-        self._update_position(self.ball_pos, self.ball_vel)
+        # Player 2 only moves when an opponent drives it, and only in the per-tick mode
+        if self.opponent_action is not None and not self.turn_based:
+            opponent_angle = np.radians(self.opponent_action[0])
+            self.player2_vel[0] = self.opponent_action[1] * np.cos(opponent_angle) * speed
+            self.player2_vel[1] = self.opponent_action[1] * np.sin(opponent_angle) * speed
 
-        # Handle collisions
-        self._handle_collision(self.player1_pos, self.ball_pos)
-        self._handle_collision(self.player2_pos, self.ball_pos)
-        
-        reward, done = self._check_goal()
+        if self.turn_based:
+            goal, ticks = self.world.resolve_shot()
+            reward, done = self._check_goal(goal)
+            reward += self._shaping_reward(done)
+            return self._get_obs(), reward, done, {'ticks': ticks}
+
+        # Move every disc, bounce off walls and resolve player/ball contacts
+        goals = self.world.step()
+        reward, done = self._check_goal(goals[0])
+        reward += self._shaping_reward(done)
 
         return self._get_obs(), reward, done, {}
-    
-    def _update_position(self, pos, vel):
-        pos[0] += vel[0]
-        pos[1] += vel[1]
-        vel[0] *= 0.98  # Friction
-        vel[1] *= 0.98  # Friction
-        
-        # Keep positions inside boundaries
-        pos[0] = np.clip(pos[0], self.PLAYER_RADIUS, self.WIDTH - self.PLAYER_RADIUS)
-        pos[1] = np.clip(pos[1], self.PLAYER_RADIUS, self.HEIGHT - self.PLAYER_RADIUS)
-
-    def _handle_collision(self, pos1, pos2):
-        dx = pos1[0] - pos2[0]
-        dy = pos1[1] - pos2[1]
-        distance = math.sqrt(dx ** 2 + dy ** 2)
-        if distance < self.PLAYER_RADIUS + self.BALL_RADIUS:
-            # Simple elastic collision (reverse velocity)
-            pos1[0] += dx * 0.1
-            pos1[1] += dy * 0.1
-
-    def _check_goal(self):
-        if self.ball_pos[0] < 10:  # Player 2 scores
+
+    def get_state(self, out=None):
+        """
+        The whole game as a flat float64 array of state_size: physics, shaping potential, then curriculum.
+
+        set_state() puts it back, far cheaper than copy.deepcopy(env). The
+        only randomness is the curriculum's scenario sampler, whose generator
+        is saved along with the stage and win window (zeros without a
+        curriculum).
+        """
+        size = self.world.state_size
+        state = np.empty(self.state_size) if out is None else out
+        self.world.get_state(out=state[None, :size])
+        state[size] = self.shaping.last[0] if self.shaping is not None else 0
+        if self.curriculum is not None:
+            self.curriculum.get_state(out=state[size + 1:])
+        else:
+            state[size + 1:] = 0
+        return state
+
+    def set_state(self, state):
+        if len(state) != self.state_size:
+            raise ValueError(f"SoccerStarsEnv states hold {self.state_size} values, got {len(state)}")
+        size = self.world.state_size
+        self.world.set_state(state[:size])
+        if self.shaping is not None:
+            self.shaping.last[0] = state[size]
+        if self.curriculum is not None:
+            self.curriculum.set_state(state[size + 1:])
+
+    def set_opponent_action(self, action):
+        """Player 2's (angle, force) for the following steps; None leaves it standing still."""
+        self.opponent_action = action
+
+    def _shaping_reward(self, done):
+        return 0 if self.shaping is None else float(self.shaping.step(done)[0])
+
+    def _check_goal(self, goal):
+        if goal and self.curriculum is not None:
+            self.curriculum.record(goal)
+        if goal < 0:  # Player 2 scores
             return -1, True
-        elif self.ball_pos[0] > self.WIDTH - 10:  # Player 1 scores
+        elif goal > 0:  # Player 1 scores
             return 1, True
         return 0, False
     
     def _get_obs(self):
-        return np.array(
-            self.player1_pos + self.player1_vel +
-            self.player2_pos + self.player2_vel +
-            self.ball_pos + self.ball_vel
-        )
+        # (x, y, vx, vy) for every player, then every ball
+        get_obs(self.world, self._obs)
+        return self._obs[0].copy() if self.copy_obs else self._obs[0]
 
     def render(self, mode='human'):
-        if not hasattr(self, 'screen'):  # Only initialize Pygame if it's not already initialized
-            pygame.init()
-            self.screen = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
-            pygame.display.set_caption('Soccer Stars AI')
-
-        # Fill the background with black
-        self.screen.fill((0, 0, 0))  # Black background
-
-        # Draw goals (left and right goal zones)
-        pygame.draw.rect(self.screen, (255, 0, 0), (0, self.HEIGHT // 2 - 50, 10, 100))  # Left goal
-        pygame.draw.rect(self.screen, (0, 0, 255), (self.WIDTH - 10, self.HEIGHT // 2 - 50, 10, 100))  # Right goal
-
-        # Draw the players as circles
-        pygame.draw.circle(self.screen, (0, 0, 255), (int(self.player1_pos[0]), int(self.player1_pos[1])), self.PLAYER_RADIUS)
-        pygame.draw.circle(self.screen, (255, 0, 0), (int(self.player2_pos[0]), int(self.player2_pos[1])), self.PLAYER_RADIUS)
+        """Draw the pitch in a window ('human') or return an offscreen RGB frame ('rgb_array')."""
+        if self.renderer is None:
+            from env.rendering import PitchRenderer  # pygame is only loaded once something is drawn
 
-        # Draw the ball as a white circle
-        pygame.draw.circle(self.screen, (255, 255, 255), (int(self.ball_pos[0]), int(self.ball_pos[1])), self.BALL_RADIUS)
+            self.renderer = PitchRenderer(
+                self.world, self.PLAYER_RADIUS, self.BALL_RADIUS, self.players_per_side,
+                render_every=self.render_every,
+            )
+        return self.renderer.render(mode)
 
-        # Update the display
-        pygame.display.flip()
+    def close(self):
+        if self.renderer is not None:
+            self.renderer.close()
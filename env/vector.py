@@ -0,0 +1,245 @@
+"""
+Gymnasium vector versions of the air hockey and Soccer Stars environments.
+
+Every game of the batch lives in one multi-world DiscWorld and is stepped
+with one call, the same way BatchedAirHockeyEnv does it, but through the
+Gymnasium API: reset(seed=...) returns (obs, info), step() returns
+(obs, rewards, terminations, truncations, info) with info as a dict of
+arrays, and finished games are reset automatically.
+
+Seeding: reset(seed=s) gives env i its own generator seeded with s + i
+(or seed[i] for a list), the way Gymnasium's SyncVectorEnv seeds its
+sub-envs. Each game's randomness only depends on its own seed, so a run
+is reproduced exactly however the games are split across workers.
+"""
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from env import air_hockey_env, soccer_stars_env
+from env.scenarios import RNG_STATE_SIZE, pack_rng, unpack_rng
+
+
+class _DiscVectorEnv(VectorEnv):
+    """
+    Shared reset, autoreset and truncation logic; subclasses drive the world.
+
+    autoreset_mode follows Gymnasium: 'NextStep' (default) resets a finished
+    game on the following step() and ignores that step's action,
+    'SameStep' resets it straight away and returns the last observation in
+    info['final_obs'], 'Disabled' leaves it to reset(options={'reset_mask': ...}).
+    kickoff_jitter moves every player up to that many pixels from its
+    kickoff spot at reset, drawn from the game's own generator.
+    """
+
+    obs_dim = None
+
+    def __init__(self, num_envs, world, single_action_space, max_episode_steps=None,
+                 kickoff_jitter=0.0, autoreset_mode=AutoresetMode.NEXT_STEP, copy_obs=False):
+        self.num_envs = num_envs
+        self.world = world
+        self.single_observation_space = spaces.Box(0, max(world.table.width, world.table.height),
+                                                   shape=(self.obs_dim,), dtype=np.float32)
+        self.single_action_space = single_action_space
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.metadata = {'autoreset_mode': AutoresetMode(autoreset_mode), 'render_modes': []}
+
+        self.max_episode_steps = max_episode_steps
+        self.kickoff_jitter = kickoff_jitter
+        self.copy_obs = copy_obs
+        self.rngs = [np.random.default_rng(i) for i in range(num_envs)]
+        self.episode_steps = np.zeros(num_envs, dtype=np.int64)
+        self._needs_reset = np.zeros(num_envs, dtype=bool)
+
+        # Two output buffers used in turn, like BatchedAirHockeyEnv
+        self._slot = 0
+        self._obs = np.empty((2, num_envs, self.obs_dim), dtype=np.float32)
+        self._rewards = np.empty((2, num_envs), dtype=np.float32)
+        self._terminations = np.empty((2, num_envs), dtype=bool)
+        self._truncations = np.empty((2, num_envs), dtype=bool)
+
+    def reset(self, *, seed=None, options=None):
+        # A list holds one seed per env; the VectorEnv's own np_random only takes a single int
+        seeds = seed if isinstance(seed, (list, tuple)) else None
+        if seeds is not None and len(seeds) != self.num_envs:
+            raise ValueError(f"Got {len(seeds)} seeds for {self.num_envs} envs")
+        super().reset(seed=seed if seeds is None else seeds[0])
+        if seed is not None:
+            if seeds is None:
+                seeds = [seed + i for i in range(self.num_envs)]
+            self.rngs = [np.random.default_rng(s) for s in seeds]
+
+        mask = np.ones(self.num_envs, dtype=bool)
+        if options and 'reset_mask' in options:
+            mask = np.asarray(options['reset_mask'], dtype=bool)
+        self._reset_games(mask)
+
+        self._slot ^= 1
+        obs = self._get_obs(self._obs[self._slot])
+        return self._output(obs), {}
+
+    def step(self, actions):
+        mode = self.metadata['autoreset_mode']
+        resetting = self._needs_reset.copy() if mode == AutoresetMode.NEXT_STEP else np.zeros(self.num_envs, bool)
+        if resetting.any():
+            self._reset_games(resetting)
+
+        # Games that were just reset stand still this step: every velocity is zero at kickoff
+        goals = self._advance(actions, ~resetting)
+
+        self._slot ^= 1
+        obs, rewards = self._obs[self._slot], self._rewards[self._slot]
+        terminations, truncations = self._terminations[self._slot], self._truncations[self._slot]
+        np.not_equal(goals, 0, out=terminations)
+        terminations &= ~resetting
+        rewards[:] = goals
+        rewards[resetting] = 0
+        self.episode_steps += ~resetting
+        truncations[:] = False
+        if self.max_episode_steps is not None:
+            np.greater_equal(self.episode_steps, self.max_episode_steps, out=truncations)
+            truncations &= ~terminations
+        self._get_obs(obs)
+
+        info = {'goal': goals.astype(np.int8), '_goal': np.ones(self.num_envs, dtype=bool)}
+        done = terminations | truncations
+        if mode == AutoresetMode.NEXT_STEP:
+            self._needs_reset = done
+        elif mode == AutoresetMode.SAME_STEP and done.any():
+            final_obs = np.empty(self.num_envs, dtype=object)
+            for i in np.flatnonzero(done):
+                final_obs[i] = obs[i].copy()
+            info['final_obs'], info['_final_obs'] = final_obs, done.copy()
+            self._reset_games(done)
+            self._get_obs(obs)
+
+        return (self._output(obs), self._output(rewards), self._output(terminations),
+                self._output(truncations), info)
+
+    @property
+    def state_size(self):
+        return self.world.state_size + 2 + RNG_STATE_SIZE
+
+    def get_states(self, indices=None):
+        """
+        Snapshots of the selected games (all by default) as float64 rows of state_size.
+
+        A row holds the physics, the episode step count, the pending-reset
+        flag and the game's generator, so a restored game also draws the
+        same kickoff jitter from then on.
+        """
+        indices = range(self.num_envs) if indices is None else indices
+        indices = np.asarray(indices)
+        size = self.world.state_size
+        out = np.empty((len(indices), self.state_size))
+        self.world.get_state(indices, out=out[:, :size])
+        out[:, size] = self.episode_steps[indices]
+        out[:, size + 1] = self._needs_reset[indices]
+        for row, i in enumerate(indices):
+            pack_rng(self.rngs[i], out[row, size + 2:])
+        return out
+
+    def set_states(self, states, indices=None):
+        """Restore get_states() rows into the selected games; a single row goes to every one of them."""
+        states = np.atleast_2d(states)
+        if states.shape[1] != self.state_size:
+            # The gym envs' get_state() rows hold the shaping and curriculum instead of the episode bookkeeping
+            raise ValueError(f"{type(self).__name__} state rows hold {self.state_size} values, got {states.shape[1]}")
+        indices = np.arange(self.num_envs) if indices is None else np.asarray(indices)
+        size = self.world.state_size
+        self.world.set_state(states[:, :size], indices)
+        self.episode_steps[indices] = states[:, size]
+        self._needs_reset[indices] = states[:, size + 1].astype(bool)
+        for k, i in enumerate(indices):
+            self.rngs[i] = unpack_rng(states[k % len(states), size + 2:])
+
+    def _reset_games(self, mask):
+        pos = self.world.pos[mask, :self.world.num_players]
+        pos[:] = self._kickoff()
+        if self.kickoff_jitter:
+            for k, i in enumerate(np.flatnonzero(mask)):
+                pos[k] += self.rngs[i].uniform(-self.kickoff_jitter, self.kickoff_jitter, pos[k].shape)
+        self.world.pos[mask, :self.world.num_players] = pos
+        self.world.vel[mask] = 0
+        self.world.reset_ball(mask)
+        self.episode_steps[mask] = 0
+        self._needs_reset[mask] = False
+
+    def _output(self, array):
+        return array.copy() if self.copy_obs else array
+
+    def _kickoff(self):
+        raise NotImplementedError
+
+    def _advance(self, actions, active):
+        """Apply the actions of the active games, step the world, return the goal per game."""
+        raise NotImplementedError
+
+    def _get_obs(self, out):
+        raise NotImplementedError
+
+
+class AirHockeyVectorEnv(_DiscVectorEnv):
+    """num_envs AirHockeyEnv tables; the agent moves team2's paddles, rewards are +1/-1 per goal."""
+
+    obs_dim = 16
+
+    def __init__(self, num_envs=8, **kwargs):
+        super(AirHockeyVectorEnv, self).__init__(
+            num_envs, air_hockey_env.make_world(num_worlds=num_envs), spaces.MultiDiscrete([3, 3, 3]), **kwargs,
+        )
+        self._team2_vy = np.empty((num_envs, 3), dtype=np.float32)
+
+    def _kickoff(self):
+        return air_hockey_env.KICKOFF_POSITIONS
+
+    def _advance(self, actions, active):
+        np.take(air_hockey_env.ACTION_VELOCITY, np.asarray(actions).reshape(self.num_envs, 3), out=self._team2_vy)
+        self._team2_vy[~active] = 0
+        self.world.vel[:, 3:6, 1] = self._team2_vy
+        return self.world.step().copy()
+
+    def _get_obs(self, out):
+        return air_hockey_env.get_obs(self.world, out)
+
+
+class SoccerStarsVectorEnv(_DiscVectorEnv):
+    """num_envs SoccerStarsEnv pitches; each action flicks that pitch's player 1 as (angle, force)."""
+
+    def __init__(self, num_envs=8, players_per_side=1, num_balls=1, turn_based=False, **kwargs):
+        self.obs_dim = 4 * (2 * players_per_side + num_balls)
+        self.players_per_side = players_per_side
+        self.turn_based = turn_based
+        self.speed = soccer_stars_env.MAX_SHOT_SPEED if turn_based else soccer_stars_env.MAX_SPEED
+        self.kickoff = soccer_stars_env.kickoff_positions(players_per_side)
+        action_space = spaces.Box(low=np.array([0, 0], dtype=np.float32), high=np.array([360, 1], dtype=np.float32))
+        world = soccer_stars_env.make_world(players_per_side, num_balls, num_worlds=num_envs)
+        super(SoccerStarsVectorEnv, self).__init__(num_envs, world, action_space, **kwargs)
+
+    def _kickoff(self):
+        return self.kickoff
+
+    def _advance(self, actions, active):
+        actions = np.asarray(actions, dtype=np.float32).reshape(self.num_envs, 2)
+        angle = np.radians(actions[:, 0])
+        force = np.where(active, actions[:, 1], 0) * self.speed
+        self.world.vel[:, 0, 0] = force * np.cos(angle)
+        self.world.vel[:, 0, 1] = force * np.sin(angle)
+
+        if not self.turn_based:
+            return self.world.step().copy()
+        goals = np.zeros(self.num_envs, dtype=np.int8)
+        for i in np.flatnonzero(active):
+            goals[i] = self.world.resolve_shot(i)[0]
+        return goals
+
+    def _get_obs(self, out):
+        return soccer_stars_env.get_obs(self.world, out)
+
+
+def make_vector_env(name, num_envs=8, **kwargs):
+    """AirHockeyVectorEnv or SoccerStarsVectorEnv by name ('air_hockey' or 'soccer_stars')."""
+    envs = {'air_hockey': AirHockeyVectorEnv, 'soccer_stars': SoccerStarsVectorEnv}
+    return envs[name](num_envs, **kwargs)
@@ -0,0 +1,179 @@
+import json
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import traceback
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+from env.batched_air_hockey_env import BatchedAirHockeyEnv
+
+EVAL_ENVS = 16            # Tables evaluated side by side
+EVAL_EPISODES = 32        # Episodes per evaluation
+EVAL_MAX_STEPS = 1000     # An episode without a goal by then counts as a draw
+BEST_MODEL_NAME = "best_model"  # Same file name EvalCallback used
+POLL_SECONDS = 1.0        # How often a blocking wait checks that the worker is still alive
+
+
+def evaluate_batched(model, num_envs=EVAL_ENVS, episodes=EVAL_EPISODES, max_steps=EVAL_MAX_STEPS, deterministic=True):
+    """
+    Play `episodes` episodes on one BatchedAirHockeyEnv with a predict() call per step for all tables.
+
+    Each table plays a fixed share of the episodes, as in stable-baselines3's
+    evaluate_policy: keeping whichever episodes end first would favour the
+    short, decisive games over draws that run to max_steps.
+
+    Returns a dict with win_rate, goal_difference (mean reward per episode,
+    every goal is +1 or -1), mean_episode_length and episodes.
+    """
+    env = BatchedAirHockeyEnv(num_envs=num_envs)
+    obs = env.reset()
+    returns = np.zeros(num_envs)
+    lengths = np.zeros(num_envs, dtype=int)
+    targets = np.array([(episodes + i) // num_envs for i in range(num_envs)])
+    counts = np.zeros(num_envs, dtype=int)
+    finished_returns, finished_lengths = [], []
+
+    while (counts < targets).any():
+        actions, _ = model.predict(obs, deterministic=deterministic)
+        obs, rewards, dones, _ = env.step(actions)
+        returns += rewards
+        lengths += 1
+
+        # Tables that ran out of time are cut off as draws and reset
+        timeouts = (lengths >= max_steps) & ~dones
+        if timeouts.any():
+            obs = env.reset_tables(timeouts, out=obs)
+        for i in np.flatnonzero(dones | timeouts):
+            if counts[i] < targets[i]:
+                finished_returns.append(returns[i])
+                finished_lengths.append(lengths[i])
+                counts[i] += 1
+            returns[i] = 0
+            lengths[i] = 0
+
+    returns = np.array(finished_returns)
+    return {
+        "episodes": episodes,
+        "win_rate": float((returns > 0).mean()),
+        "goal_difference": float(returns.mean()),
+        "mean_episode_length": float(np.mean(finished_lengths)),
+    }
+
+
+def _eval_worker(requests, results, num_envs, episodes, max_steps, models_dir):
+    # Loaded here so the training process never pays for a second policy on its device
+    from stable_baselines3 import PPO
+
+    best = -np.inf
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            timesteps, path = request
+            model = PPO.load(path, device="cpu")
+            summary = evaluate_batched(model, num_envs, episodes, max_steps)
+            summary["timesteps"] = timesteps
+
+            # Ranked like EvalCallback's mean reward, win rate breaks ties
+            score = (summary["goal_difference"], summary["win_rate"])
+            summary["best"] = best == -np.inf or score > best
+            if summary["best"]:
+                best = score
+                shutil.copyfile(path, os.path.join(models_dir, BEST_MODEL_NAME + ".zip"))
+            os.remove(path)
+            results.put(summary)
+    except Exception:
+        # The trainer raises this instead of waiting for results that will never come
+        results.put({"error": traceback.format_exc()})
+
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    Evaluates snapshots of the model in a background process while training continues.
+
+    Every eval_freq calls the policy is saved to models_dir and queued for
+    the worker, which runs it on a batched eval env and copies the best one
+    so far to models_dir/best_model.zip. If the worker is still busy with
+    an earlier snapshot, at most one newer one waits and any others are
+    skipped. Results are logged (eval/win_rate, eval/goal_difference,
+    eval/mean_ep_length) as they arrive, appended to log_path/evaluations.jsonl,
+    and summarised when training ends.
+    """
+
+    def __init__(self, models_dir, log_path, eval_freq, num_envs=EVAL_ENVS, episodes=EVAL_EPISODES,
+                 max_steps=EVAL_MAX_STEPS, verbose=1):
+        super(AsyncEvalCallback, self).__init__(verbose)
+        self.models_dir = models_dir
+        self.log_path = log_path
+        self.eval_freq = eval_freq
+        self.worker_args = (num_envs, episodes, max_steps, models_dir)
+        self.history = []
+        self._in_flight = 0
+        self._process = None
+
+    def _on_training_start(self):
+        ctx = mp.get_context("spawn")  # The parent may already run torch threads, never fork it
+        self._requests = ctx.Queue()
+        self._results = ctx.Queue()
+        self._process = ctx.Process(target=_eval_worker, args=(self._requests, self._results) + self.worker_args,
+                                    daemon=True)
+        self._process.start()
+
+    def _on_step(self):
+        self._collect()
+        if self.n_calls % self.eval_freq == 0:
+            if self._in_flight >= 2:
+                if self.verbose:
+                    print(f"Evaluation still running, skipping the snapshot at {self.num_timesteps} timesteps")
+            else:
+                path = os.path.join(self.models_dir, f"eval_snapshot_{self.num_timesteps}.zip")
+                self.model.save(path)
+                self._requests.put((self.num_timesteps, path))
+                self._in_flight += 1
+        return True
+
+    def _on_training_end(self):
+        # Wait for the snapshots already handed over, then stop the worker
+        self._collect(block=True)
+        self._requests.put(None)
+        self._process.join()
+        if self.history:
+            self._write_summary()
+
+    def _collect(self, block=False):
+        while self._in_flight:
+            alive = self._process.is_alive()
+            try:
+                summary = self._results.get(block=block, timeout=POLL_SECONDS if block else None)
+            except queue.Empty:
+                if not alive:
+                    raise RuntimeError(f"The evaluation worker died (exit code {self._process.exitcode})")
+                if block:
+                    continue
+                return
+            if "error" in summary:
+                raise RuntimeError(f"The evaluation worker failed:\n{summary['error']}")
+            self._in_flight -= 1
+            self.history.append(summary)
+            self.logger.record("eval/win_rate", summary["win_rate"])
+            self.logger.record("eval/goal_difference", summary["goal_difference"])
+            self.logger.record("eval/mean_ep_length", summary["mean_episode_length"])
+            with open(os.path.join(self.log_path, "evaluations.jsonl"), "a") as f:
+                f.write(json.dumps(summary) + "\n")
+            if self.verbose:
+                print(f"Eval at {summary['timesteps']} timesteps: win rate {summary['win_rate']:.2f}, "
+                      f"goal difference {summary['goal_difference']:+.2f}, "
+                      f"episode length {summary['mean_episode_length']:.0f}" + (" (new best)" if summary["best"] else ""))
+
+    def _write_summary(self):
+        best = max(self.history, key=lambda s: (s["goal_difference"], s["win_rate"]))
+        summary = {"evaluations": len(self.history), "best": best, "last": self.history[-1]}
+        with open(os.path.join(self.log_path, "eval_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        if self.verbose:
+            print(f"{len(self.history)} evaluations, best at {best['timesteps']} timesteps: "
+                  f"win rate {best['win_rate']:.2f}, goal difference {best['goal_difference']:+.2f}")
@@ -1,10 +1,17 @@
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
-from pytube import YouTube
-from PIL import Image
+import numpy as np
+
+# Skipping more frames than this seeks instead of grabbing frame by frame
+SEEK_THRESHOLD = 48
 
 def download_youtube_video(video_url, output_path="downloaded_video.mp4"):
     """Downloads a YouTube video to the specified path."""
+    from pytube import YouTube  # Only needed for downloads, local files work without it
+
     print(f"Downloading video from {video_url}...")
     yt = YouTube(video_url)
     video_stream = yt.streams.filter(progressive=True, file_extension="mp4").first()
@@ -13,44 +20,88 @@ def download_youtube_video(video_url, output_path="downloaded_video.mp4"):
     print(f"Video downloaded successfully at {video_path}")
     return video_path
 
-def extract_frames_evenly(video_path, output_dir="frames", frame_count=100):
-    """Extracts frames evenly spaced from the video."""
+def iter_frames(video_path, frame_count=100, rgb=False):
+    """
+    Yields (frame_number, frame) for frame_count frames evenly spaced through the video.
+
+    Frames that are not kept are never decoded into images: short gaps are
+    skipped with grab() and long ones with a seek. Frames are BGR NumPy
+    arrays as OpenCV decodes them, or RGB with rgb=True.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_interval = max(1, total_frames // frame_count)  # Calculate frame interval to get frame_count frames
+
+    position = 0
+    try:
+        for kept in range(frame_count):
+            target = kept * frame_interval
+            gap = target - position
+            if gap > SEEK_THRESHOLD:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            else:
+                for _ in range(gap):
+                    if not cap.grab():
+                        return
+            ret, frame = cap.read()
+            if not ret:
+                return
+            position = target + 1
+            yield target, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if rgb else frame
+    finally:
+        cap.release()
+
+def iter_frame_batches(video_path, frame_count=100, batch_size=32, rgb=False):
+    """Yields (frame_numbers, frames) with frames stacked into (batch, height, width, 3) arrays."""
+    numbers, frames = [], []
+    for number, frame in iter_frames(video_path, frame_count, rgb=rgb):
+        numbers.append(number)
+        frames.append(frame)
+        if len(frames) == batch_size:
+            yield np.array(numbers), np.stack(frames)
+            numbers, frames = [], []
+    if frames:
+        yield np.array(numbers), np.stack(frames)
+
+def extract_frames_evenly(video_path, output_dir="frames", frame_count=100, workers=4):
+    """Extracts frames evenly spaced from the video, encoding the PNGs on a thread pool."""
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    
+
     print(f"Extracting {frame_count} frames evenly from video {video_path}...")
-    cap = cv2.VideoCapture(video_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    frame_interval = max(1, total_frames // frame_count)  # Calculate frame interval to get 100 frames
-    
-    print(f"Video has {total_frames} total frames. Extracting 1 frame every {frame_interval} frames.")
-    
-    frame_number = 0
+
     extracted_frame_count = 0
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        
-        if not ret or extracted_frame_count >= frame_count:
-            break
-        
-        if frame_number % frame_interval == 0:
+    pending = []
+    # cv2.imwrite releases the GIL, so PNG encoding runs in parallel with decoding
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _, frame in iter_frames(video_path, frame_count):
             frame_filename = os.path.join(output_dir, f"frame_{extracted_frame_count:03d}.png")
-            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(image)
-            img.save(frame_filename)
-            print(f"Saved frame {extracted_frame_count + 1}/{frame_count} at {frame_filename}")
+            pending.append(pool.submit(cv2.imwrite, frame_filename, frame))
             extracted_frame_count += 1
-        
-        frame_number += 1
-    
-    cap.release()
+
+            # Keep only a few frames in flight so memory stays flat on long videos
+            if len(pending) >= 2 * workers:
+                pending.pop(0).result()
+        for future in pending:
+            future.result()
+
     print(f"Successfully extracted {extracted_frame_count} frames to {output_dir}.")
+    return extracted_frame_count
 
 def main():
-    video_url = "https://www.youtube.com/watch?v=YOUR_VIDEO_ID_HERE"
-    video_path = download_youtube_video(video_url)
-    extract_frames_evenly(video_path, output_dir="frames", frame_count=100)
+    parser = argparse.ArgumentParser(description="Extract evenly spaced frames from a gameplay video.")
+    parser.add_argument("video", help="Local video file, or a YouTube URL to download first")
+    parser.add_argument("--output-dir", default="frames")
+    parser.add_argument("--frames", type=int, default=100, help="Number of frames to extract")
+    parser.add_argument("--workers", type=int, default=4, help="Threads encoding PNGs")
+    args = parser.parse_args()
+
+    video_path = args.video
+    if not os.path.exists(video_path):
+        video_path = download_youtube_video(video_path)
+    extract_frames_evenly(video_path, output_dir=args.output_dir, frame_count=args.frames, workers=args.workers)
 
 if __name__ == "__main__":
     main()
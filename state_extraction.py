@@ -0,0 +1,302 @@
+"""
+Turn Soccer Stars gameplay video into SoccerStarsEnv observation arrays.
+
+Frames come from frame_extraction.iter_frame_batches and are processed a
+batch at a time on downscaled copies. The pitch is located with a cache
+of field templates built from assets/field*.png. Discs and balls are found
+with colour masking plus Hough circles, split into teams by colour, mapped
+onto the SoccerStarsEnv pitch and written in the layout of
+SoccerStarsEnv._get_obs: (x, y, vx, vy) for team 1, team 2, then the balls.
+Slots with no detection are NaN. The dataset is a memory-mapped .npy file
+with one row per frame, plus a second .npy holding the source frame numbers.
+
+    python state_extraction.py gameplay.mp4 states.npy --frames 5000
+"""
+import argparse
+import glob
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+from env.physics import SOCCER_STARS_TABLE
+from frame_extraction import iter_frame_batches
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "field_templates")  # Next to env/shaping.py's
+
+WORK_WIDTH = 480          # Frames are downscaled to this width before detection
+PITCH_COLOUR_DISTANCE = 25  # Chroma (Lab a, b) distance still counted as pitch, ignores stadium shadows
+# Radii as fractions of the pitch width
+MIN_RADIUS = 0.011
+BALL_MAX_RADIUS = 0.023
+MAX_RADIUS = 0.045
+BALL_MIN_TEXTURE = 15  # Lightness spread inside a ball; the flat centre spot stays below it
+
+
+class FieldTemplates:
+    """
+    Pitch colour and pitch rectangle for every reference field screenshot.
+
+    Built once from assets/field*.png on downscaled copies and cached as .npz
+    under the repository's .cache/field_templates, keyed by the asset files' names and mtimes.
+    """
+
+    def __init__(self, assets_dir=ASSETS_DIR, cache_dir=CACHE_DIR):
+        paths = sorted(glob.glob(os.path.join(assets_dir, "field*.png")))
+        if not paths:
+            raise FileNotFoundError(f"No field*.png templates in {assets_dir}")
+        key = hashlib.sha1("".join(f"{p}:{os.path.getmtime(p)}" for p in paths).encode()).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"field_templates_{key}.npz")
+
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                self.colours, self.rects = cached["colours"], cached["rects"]
+        else:
+            templates = [_measure_field(cv2.imread(p)) for p in paths]
+            self.colours = np.array([colour for colour, _ in templates], dtype=np.float32)
+            self.rects = np.array([rect for _, rect in templates], dtype=np.float32)
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(cache_path, colours=self.colours, rects=self.rects)
+
+    def match(self, centre_colours):
+        """Index of the closest template for each frame, by the Lab colour at the centre of the pitch."""
+        distance = np.linalg.norm(centre_colours[:, None] - self.colours[None], axis=2)
+        return distance.argmin(axis=1)
+
+
+def _measure_field(image):
+    """(Lab pitch colour, pitch rect as fractions (x0, y0, x1, y1)) of one field screenshot."""
+    small = _downscale(image)
+    lab = cv2.cvtColor(small, cv2.COLOR_BGR2LAB).astype(np.float32)
+    colour = _centre_colour(lab[None])[0]
+    mask = (np.linalg.norm(lab[..., 1:] - colour[1:], axis=2) < PITCH_COLOUR_DISTANCE).astype(np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask)
+    largest = 1 + stats[1:, cv2.CC_STAT_AREA].argmax()
+    x, y, w, h = stats[largest, :4]
+    height, width = mask.shape
+    return colour, (x / width, y / height, (x + w) / width, (y + h) / height)
+
+
+def _downscale(frame):
+    height, width = frame.shape[:2]
+    return cv2.resize(frame, (WORK_WIDTH, round(height * WORK_WIDTH / width)), interpolation=cv2.INTER_AREA)
+
+
+def _centre_colour(labs):
+    """Median Lab colour of the middle of each frame, where the pitch always is."""
+    _, height, width, _ = labs.shape
+    centre = labs[:, height * 3 // 8:height * 5 // 8, width * 3 // 8:width * 5 // 8]
+    return np.median(centre.reshape(len(labs), -1, 3), axis=1)
+
+
+class StateExtractor:
+    """Detects discs and balls in batches of BGR frames and returns observation rows."""
+
+    def __init__(self, players_per_side=5, num_balls=1, templates=None):
+        self.players_per_side = players_per_side
+        self.num_balls = num_balls
+        self.obs_dim = 4 * (2 * players_per_side + num_balls)
+        self.templates = templates or FieldTemplates()
+        self._previous = None
+
+    def extract(self, frames, frame_numbers=None):
+        """(batch, obs_dim) float32 observations for a (batch, height, width, 3) BGR array."""
+        small = np.stack([_downscale(frame) for frame in frames])
+        labs = np.stack([cv2.cvtColor(frame, cv2.COLOR_BGR2LAB) for frame in small]).astype(np.float32)
+        batch, height, width, _ = labs.shape
+
+        # Every frame is matched to a template and masked against its own pitch colour at once
+        pitch_colour = _centre_colour(labs)
+        template = self.templates.match(pitch_colour)
+        rects = self.templates.rects[template] * np.array([width, height, width, height], dtype=np.float32)
+        foreground = np.linalg.norm(labs[..., 1:] - pitch_colour[:, None, None, 1:], axis=3) > PITCH_COLOUR_DISTANCE
+
+        ys, xs = np.mgrid[:height, :width]
+        inside = ((xs >= rects[:, 0, None, None]) & (xs < rects[:, 2, None, None]) &
+                  (ys >= rects[:, 1, None, None]) & (ys < rects[:, 3, None, None]))
+        foreground &= inside
+
+        out = np.full((batch, self.obs_dim), np.nan, dtype=np.float32)
+        for k in range(batch):
+            pitch_width = rects[k, 2] - rects[k, 0]
+            circles = self._find_circles(foreground[k], pitch_width)
+            self._fill_row(out[k], circles, labs[k], rects[k], pitch_width)
+
+        self._fill_velocities(out, frame_numbers)
+        return out
+
+    def _find_circles(self, mask, pitch_width):
+        # Opening with a disc smaller than the ball removes the pitch lines
+        size = max(3, int(MIN_RADIUS * pitch_width * 1.5) | 1)
+        mask = cv2.morphologyEx(mask.astype(np.uint8) * 255, cv2.MORPH_OPEN,
+                                cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size)))
+        circles = cv2.HoughCircles(
+            cv2.GaussianBlur(mask, (5, 5), 0), cv2.HOUGH_GRADIENT, dp=1,
+            minDist=MIN_RADIUS * pitch_width * 1.8, param1=100, param2=12,
+            minRadius=int(MIN_RADIUS * pitch_width), maxRadius=int(MAX_RADIUS * pitch_width) + 1,
+        )
+        return np.empty((0, 3), dtype=np.float32) if circles is None else circles[0]
+
+    def _fill_row(self, row, circles, lab, rect, pitch_width):
+        if not len(circles):
+            return
+        is_ball = circles[:, 2] < BALL_MAX_RADIUS * pitch_width
+        balls, players = circles[is_ball], circles[~is_ball]
+        if len(balls):
+            # Drop small circles found inside a disc, then rank the rest by how patterned they are
+            if len(players):
+                gap = np.linalg.norm(balls[:, None, :2] - players[None, :, :2], axis=2)
+                balls = balls[(gap > players[None, :, 2]).all(axis=1)]
+            texture = np.array([_lightness_spread(lab, ball) for ball in balls])
+            order = np.argsort(-texture)
+            balls = balls[order[texture[order] > BALL_MIN_TEXTURE]]
+
+        # Map frame pixels onto the SoccerStarsEnv pitch
+        t = SOCCER_STARS_TABLE
+        scale = np.array([(t.boundary_right - t.boundary_left) / (rect[2] - rect[0]),
+                          (t.boundary_bottom - t.boundary_top) / (rect[3] - rect[1])], dtype=np.float32)
+        origin = np.array([t.boundary_left, t.boundary_top], dtype=np.float32)
+
+        def to_pitch(found):
+            return (found[:, :2] - rect[:2]) * scale + origin
+
+        n = self.players_per_side
+        if len(players):
+            # Split the players into two teams by the colour at their centres; team 1 is the one further left
+            centres = np.clip(players[:, :2].astype(int), 0, [lab.shape[1] - 1, lab.shape[0] - 1])
+            colours = lab[centres[:, 1], centres[:, 0], 1:]
+            team = _two_means(colours)
+            if len(players[team == 0]) and len(players[team == 1]) and \
+                    players[team == 0, 0].mean() > players[team == 1, 0].mean():
+                team = 1 - team
+            for side in (0, 1):
+                found = to_pitch(players[team == side])[:n]
+                row[4 * n * side:4 * n * side + 4 * len(found):4] = found[:, 0]
+                row[4 * n * side + 1:4 * n * side + 4 * len(found):4] = found[:, 1]
+
+        found = to_pitch(balls)[:self.num_balls]
+        start = 8 * n
+        row[start:start + 4 * len(found):4] = found[:, 0]
+        row[start + 1:start + 4 * len(found):4] = found[:, 1]
+
+    def _fill_velocities(self, out, frame_numbers):
+        """
+        Match each slot to the nearest detection of the previous frame, then difference positions.
+
+        Detections with nothing to difference against (every one on the
+        first frame) get zero velocity; only undetected slots stay NaN.
+        """
+        groups = [(0, self.players_per_side), (self.players_per_side, self.players_per_side),
+                  (2 * self.players_per_side, self.num_balls)]
+        previous, previous_number = self._previous if self._previous is not None else (None, None)
+        for k in range(len(out)):
+            number = frame_numbers[k] if frame_numbers is not None else k
+            bodies = out[k].reshape(-1, 4)
+            if previous is not None:
+                gap = max(number - previous_number, 1)
+                for first, count in groups:
+                    _match_slots(bodies[first:first + count], previous[first:first + count])
+                    bodies[first:first + count, 2:] = (bodies[first:first + count, :2] -
+                                                       previous[first:first + count, :2]) / gap
+            unmatched = ~np.isnan(bodies[:, 0]) & np.isnan(bodies[:, 2])
+            bodies[unmatched, 2:] = 0
+            previous, previous_number = bodies.copy(), number
+        self._previous = (previous, previous_number)
+
+
+def _lightness_spread(lab, circle):
+    x, y, r = circle
+    x0, y0 = max(0, int(x - r)), max(0, int(y - r))
+    patch = lab[y0:int(y + r) + 1, x0:int(x + r) + 1, 0]
+    ys, xs = np.mgrid[y0:y0 + patch.shape[0], x0:x0 + patch.shape[1]]
+    return patch[(xs - x) ** 2 + (ys - y) ** 2 < (0.8 * r) ** 2].std()
+
+
+def _two_means(points, iterations=8):
+    """Label points 0/1 with a tiny 2-means split, seeded along the direction of greatest spread."""
+    if len(points) < 2:
+        return np.zeros(len(points), dtype=int)
+    centred = points - points.mean(axis=0)
+    axis = np.linalg.svd(centred, full_matrices=False)[2][0]
+    labels = (centred @ axis > 0).astype(int)
+    for _ in range(iterations):
+        if labels.min() == labels.max():
+            break
+        centres = np.stack([points[labels == side].mean(axis=0) for side in (0, 1)])
+        labels = np.linalg.norm(points[:, None] - centres[None], axis=2).argmin(axis=1)
+    return labels
+
+
+def _match_slots(current, previous):
+    """Reorder current rows in place so each lines up with the nearest previous row (greedy)."""
+    valid_now = ~np.isnan(current[:, 0])
+    valid_before = ~np.isnan(previous[:, 0])
+    if not valid_now.any() or not valid_before.any():
+        return
+    distance = np.linalg.norm(current[:, None, :2] - previous[None, :, :2], axis=2)
+    distance[np.isnan(distance)] = np.inf
+    order = np.full(len(current), -1)
+    taken = np.zeros(len(current), dtype=bool)
+    for _ in range(min(valid_now.sum(), valid_before.sum())):
+        i, j = np.unravel_index(np.argmin(distance), distance.shape)
+        order[j] = i
+        taken[i] = True
+        distance[i, :] = np.inf
+        distance[:, j] = np.inf
+    # Detections without a previous match fill the remaining slots
+    leftovers = iter(np.flatnonzero(~taken & valid_now))
+    for j in range(len(current)):
+        if order[j] < 0:
+            order[j] = next(leftovers, -1)
+    reordered = np.full_like(current, np.nan)
+    reordered[order >= 0] = current[order[order >= 0]]
+    current[:] = reordered
+
+
+def extract_states(video_path, output_path, frame_count=1000, players_per_side=5, num_balls=1, batch_size=64):
+    """Write a (frames, obs_dim) float32 .npy dataset, memory-mapped so it never has to fit in RAM."""
+    extractor = StateExtractor(players_per_side, num_balls)
+    states = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float32,
+                                       shape=(frame_count, extractor.obs_dim))
+    states[:] = np.nan
+    numbers = np.full(frame_count, -1, dtype=np.int64)
+
+    written = 0
+    for frame_numbers, frames in iter_frame_batches(video_path, frame_count, batch_size):
+        states[written:written + len(frames)] = extractor.extract(frames, frame_numbers)
+        numbers[written:written + len(frames)] = frame_numbers
+        written += len(frames)
+
+    states.flush()
+    if written < frame_count:
+        # The video ran out early: keep only the decoded frames, copied over without loading them
+        del states
+        trimmed_path = output_path + ".part"
+        source = np.load(output_path, mmap_mode="r")
+        trimmed = np.lib.format.open_memmap(trimmed_path, mode="w+", dtype=np.float32,
+                                            shape=(written, extractor.obs_dim))
+        trimmed[:] = source[:written]
+        trimmed.flush()
+        del source, trimmed
+        os.replace(trimmed_path, output_path)
+    np.save(os.path.splitext(output_path)[0] + "_frames.npy", numbers[:written])
+    print(f"Extracted {written} states from {video_path} to {output_path}.")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract SoccerStarsEnv observations from gameplay video.")
+    parser.add_argument("video")
+    parser.add_argument("output", help="Output .npy dataset")
+    parser.add_argument("--frames", type=int, default=1000, help="Number of evenly spaced frames to process")
+    parser.add_argument("--players-per-side", type=int, default=5)
+    parser.add_argument("--balls", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    extract_states(args.video, args.output, args.frames, args.players_per_side, args.balls, args.batch_size)
+
+if __name__ == "__main__":
+    main()
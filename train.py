@@ -1,20 +1,43 @@
+import argparse
 import os
-import gym
-from stable_baselines3 import PPO
-from stable_baselines3.common.callbacks import EvalCallback, CheckpointCallback
+from functools import partial
 from env.air_hockey_env import AirHockeyEnv
 
+# stable-baselines3 (and torch with it) is imported inside the functions below:
+# rollout workers re-import this script and should not pay for it
+
 LOG_DIR = "./logs/"
 MODELS_DIR = "./models/"
 TOTAL_TIMESTEPS = 100000
 EVAL_FREQ = 10000         # Evaluate every N timesteps
 SAVE_FREQ = 20000         # Save model checkpoint every N timesteps
+NUM_ENVS = 8              # Tables simulated per vectorized step
+
+def make_env(num_envs=NUM_ENVS, workers=1, reward_shaping=False, curriculum=False):
+    """All tables in this process, or spread over worker processes with shared-memory rollouts."""
+    if workers > 1:
+        from env.shared_vec_env import SharedMemoryVecEnv
+        env_fn = partial(AirHockeyEnv, reward_shaping=reward_shaping, curriculum=curriculum)
+        return SharedMemoryVecEnv([env_fn] * num_envs, num_workers=workers)
+    from env.batched_vec_env import BatchedAirHockeyVecEnv
+    return BatchedAirHockeyVecEnv(num_envs=num_envs, reward_shaping=reward_shaping, curriculum=curriculum)
+
+def train(num_envs=NUM_ENVS, workers=1, profile=False, self_play=False, reward_shaping=False,
+          curriculum=False):
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.callbacks import CheckpointCallback
+    from env.profiling import ProfilerCallback, StepProfiler
+    from evaluation import AsyncEvalCallback
 
-def train():
     os.makedirs(LOG_DIR, exist_ok=True)
     os.makedirs(MODELS_DIR, exist_ok=True)
 
-    env = AirHockeyEnv()
+    env = make_env(num_envs, workers, reward_shaping, curriculum)
+    if self_play:
+        # Team1 is played by past snapshots of the agent instead of standing still
+        from agents.self_play import OpponentPool, SelfPlayCallback, SelfPlayVecEnv
+        pool = OpponentPool()
+        env = SelfPlayVecEnv(env, pool, game="air_hockey")
 
     model = PPO(
         policy="MlpPolicy", 
@@ -24,27 +47,47 @@ def train():
     )
 
     # Callbacks for evaluation and saving
-    eval_env = AirHockeyEnv()  # Separate environment for evaluation
-    eval_callback = EvalCallback(
-        eval_env,                      # Evaluation environment
-        best_model_save_path=MODELS_DIR,  # Path to save the best model
+    eval_callback = AsyncEvalCallback(  # Evaluates in a background process, training keeps going
+        models_dir=MODELS_DIR,         # Path to save the best model
         log_path=LOG_DIR,
-        eval_freq=EVAL_FREQ,
-        deterministic=True,
-        render=False                   # Do not render during evaluation
+        eval_freq=max(EVAL_FREQ // num_envs, 1),  # Counted in vectorized steps
     )
     checkpoint_callback = CheckpointCallback(
-        save_freq=SAVE_FREQ, save_path=MODELS_DIR, name_prefix="ppo_air_hockey"
+        save_freq=max(SAVE_FREQ // num_envs, 1), save_path=MODELS_DIR, name_prefix="ppo_air_hockey"
     )
 
+    callbacks = [eval_callback, checkpoint_callback]
+    if profile:
+        if workers > 1:
+            raise ValueError("Profiling times the env phases in this process, run it with --workers 1")
+        # Phase timings and collision counts go to the same TensorBoard run
+        profiler = StepProfiler()
+        profiler.attach(env)
+        callbacks.append(ProfilerCallback(profiler, log_dir=LOG_DIR))
+    if self_play:
+        callbacks.append(SelfPlayCallback(pool, verbose=1))
+
     print("Training started...")
     model.learn(
         total_timesteps=TOTAL_TIMESTEPS,
-        callback=[eval_callback, checkpoint_callback]
+        callback=callbacks
     )
     print("Training complete!")
 
     model.save(os.path.join(MODELS_DIR, "ppo_air_hockey_final"))
+    env.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train a PPO agent on the air hockey environment.")
+    parser.add_argument("--num-envs", type=int, default=NUM_ENVS, help="Tables collected per rollout step")
+    parser.add_argument("--workers", type=int, default=1, help="Rollout worker processes (1 = single process)")
+    parser.add_argument("--profile", action="store_true", help="Log per-phase env.step timings to TensorBoard")
+    parser.add_argument("--self-play", action="store_true", help="Train against a pool of the agent's past snapshots")
+    parser.add_argument("--reward-shaping", action="store_true", help="Add dense potential-based rewards to the goals")
+    parser.add_argument("--curriculum", action="store_true", help="Start episodes from practice scenarios that get harder")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    train()
+    args = parse_args()
+    train(num_envs=args.num_envs, workers=args.workers, profile=args.profile, self_play=args.self_play,
+          reward_shaping=args.reward_shaping, curriculum=args.curriculum)
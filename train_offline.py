@@ -0,0 +1,274 @@
+"""
+Behaviour cloning from recorded games, without touching an environment.
+
+    python train_offline.py games/*.traj --output models/bc_soccer_stars --epochs 5
+
+The recordings are TrajectoryRecorder files (env/recorder.py), read as
+memory maps: only the chunks being prefetched are ever in memory, so the
+dataset can be far larger than RAM. Background threads read shuffled
+chunks ahead of the trainer while torch uses every core for the updates.
+
+The policy is a stable-baselines3 PPO MlpPolicy, trained to maximise the
+log-likelihood of the recorded actions, and is saved as a normal PPO .zip:
+PPO.load, agents/inference.py and further online training all take it.
+--init starts from an existing checkpoint such as soccer_stars_ppo.zip.
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from env.recorder import TrajectoryReader
+
+CHUNK_STEPS = 65536       # Rows read from disk in one go
+BATCH_SIZE = 256
+PREFETCH_CHUNKS = 4       # Chunks read ahead; this bounds the memory used for data
+READ_THREADS = 2
+LEARNING_RATE = 3e-4
+ENT_COEF = 1e-3           # Keeps the policy from collapsing its spread on noisy demonstrations
+VAL_FRACTION = 0.05       # Chunks held out to measure the validation loss
+
+
+class ChunkedDataset:
+    """
+    (obs, action) minibatches streamed from one or more recordings.
+
+    Every file is cut into chunks of chunk_steps rows. An epoch visits the
+    chunks in a shuffled order; READ_THREADS threads copy them out of the
+    memory maps into a bounded queue, drop rows with missing (NaN)
+    observations, and the rows of each chunk are shuffled before being cut
+    into minibatches.
+    """
+
+    def __init__(self, readers, chunks, batch_size=BATCH_SIZE, prefetch=PREFETCH_CHUNKS, threads=READ_THREADS,
+                 seed=None):
+        self.readers = readers
+        self.chunks = chunks  # (reader index, start, stop)
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.threads = threads
+        self.rng = np.random.default_rng(seed)
+        self.wait_time = 0.0  # Seconds the consumer spent waiting for data
+
+    @classmethod
+    def split(cls, paths, chunk_steps=CHUNK_STEPS, val_fraction=VAL_FRACTION, seed=None, **kwargs):
+        """A training and a validation dataset over the same recordings, split by chunk."""
+        readers = [TrajectoryReader(path) for path in paths]
+        dims = {(reader.obs_dim, reader.action_dim) for reader in readers}
+        if len(dims) != 1:
+            raise ValueError(f"Recordings mix observation/action sizes: {sorted(dims)}")
+        chunks = [(r, start, min(start + chunk_steps, len(reader)))
+                  for r, reader in enumerate(readers) for start in range(0, len(reader), chunk_steps)]
+        if not chunks:
+            raise ValueError("The recordings hold no steps")
+
+        order = np.random.default_rng(seed).permutation(len(chunks))
+        # At least one chunk is held out whenever there are two, so the validation loss is never silently empty
+        num_val = max(1, int(round(val_fraction * len(chunks)))) if len(chunks) > 1 and val_fraction > 0 else 0
+        val = [chunks[i] for i in order[:num_val]]
+        train = [chunks[i] for i in order[num_val:]]
+        return cls(readers, train, seed=seed, **kwargs), cls(readers, val, seed=seed, **kwargs)
+
+    @property
+    def obs_dim(self):
+        return self.readers[0].obs_dim
+
+    @property
+    def action_dim(self):
+        return self.readers[0].action_dim
+
+    def __len__(self):
+        return sum(stop - start for _, start, stop in self.chunks)
+
+    def _read(self, chunk, seed):
+        r, start, stop = chunk
+        rows = np.array(self.readers[r].rows[start:stop])  # The only copy out of the memory map
+        rows = rows[~np.isnan(rows[:, :self.obs_dim]).any(axis=1)]
+        np.random.default_rng(seed).shuffle(rows)
+        return rows
+
+    def __iter__(self):
+        order = self.rng.permutation(len(self.chunks))
+        seeds = self.rng.integers(2 ** 63, size=len(order))
+        ready = queue.Queue(maxsize=self.prefetch)
+        jobs = iter(range(len(order)))
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def put(item):
+            # Gives up once the consumer is gone, so no thread stays blocked on a full queue
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def reader():
+            while not stop.is_set():
+                with lock:
+                    k = next(jobs, None)
+                if k is None:
+                    break
+                put(self._read(self.chunks[order[k]], seeds[k]))
+            put(None)  # This thread is done
+
+        threads = [threading.Thread(target=reader, daemon=True) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+
+        a = self.obs_dim
+        b = a + self.action_dim
+        finished = 0
+        try:
+            while finished < len(threads):
+                start = time.perf_counter()
+                rows = ready.get()
+                self.wait_time += time.perf_counter() - start
+                if rows is None:
+                    finished += 1
+                    continue
+                for i in range(0, len(rows), self.batch_size):
+                    batch = rows[i:i + self.batch_size]
+                    yield batch[:, :a], batch[:, a:b]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+
+def _spaces_env(env):
+    """
+    A gymnasium env that only carries `env`'s spaces, converted to gymnasium.
+
+    stable-baselines3 2.x refuses the gym 0.26 envs themselves, and the
+    policy only needs the spaces: the stub is never stepped.
+    """
+    import gymnasium
+
+    from env.shared_vec_env import to_gymnasium
+
+    class SpacesEnv(gymnasium.Env):
+        observation_space = to_gymnasium(env.observation_space)
+        action_space = to_gymnasium(env.action_space)
+
+        def reset(self, *, seed=None, options=None):
+            raise NotImplementedError("Only carries the spaces for behaviour cloning")
+
+        def step(self, action):
+            raise NotImplementedError("Only carries the spaces for behaviour cloning")
+
+    return SpacesEnv()
+
+
+def make_model(obs_dim, action_dim, init=None, players_per_side=1, num_balls=1, device="cpu"):
+    """A PPO MlpPolicy model whose spaces fit the recordings, fresh or loaded from `init`."""
+    from stable_baselines3 import PPO
+
+    if init is not None:
+        model = PPO.load(init, device=device)
+    elif (obs_dim, action_dim) == (16, 3):
+        from env.air_hockey_env import AirHockeyEnv
+        model = PPO("MlpPolicy", _spaces_env(AirHockeyEnv()), device=device)
+    else:
+        from env.soccer_stars_env import SoccerStarsEnv
+        model = PPO("MlpPolicy", _spaces_env(SoccerStarsEnv(players_per_side, num_balls)), device=device)
+
+    expected = (int(np.prod(model.observation_space.shape)), int(np.prod(model.action_space.shape or (1,))))
+    if expected != (obs_dim, action_dim):
+        raise ValueError(f"The model takes obs/action sizes {expected}, the recordings hold {(obs_dim, action_dim)}")
+    return model
+
+
+def _has_angle(action_space):
+    """Soccer Stars shots, (angle in degrees, force): the angle wraps around."""
+    low, high = getattr(action_space, "low", None), getattr(action_space, "high", None)
+    return low is not None and len(low) == 2 and high[0] - low[0] == 360
+
+
+def _loss(policy, obs, actions, ent_coef, wrap_angle=False):
+    import torch
+
+    obs = torch.as_tensor(obs, device=policy.device)
+    actions = torch.as_tensor(actions, device=policy.device)
+    distribution = policy.get_distribution(obs)
+    if wrap_angle:
+        # 359 and 1 degrees are the same shot: aim at the copy of the angle closest to the prediction
+        mean = distribution.distribution.mean[:, 0].detach()
+        actions = actions.clone()
+        actions[:, 0] = mean + torch.remainder(actions[:, 0] - mean + 180, 360) - 180
+    log_prob = distribution.log_prob(actions)
+    entropy = distribution.entropy()
+    entropy = -log_prob if entropy is None else entropy
+    return -log_prob.mean() - ent_coef * entropy.mean()
+
+
+def train_offline(paths, output, epochs=5, init=None, players_per_side=1, num_balls=1, batch_size=BATCH_SIZE,
+                  learning_rate=LEARNING_RATE, ent_coef=ENT_COEF, chunk_steps=CHUNK_STEPS,
+                  prefetch=PREFETCH_CHUNKS, threads=READ_THREADS, val_fraction=VAL_FRACTION, seed=0):
+    import torch
+
+    torch.manual_seed(seed)
+    torch.set_num_threads(os.cpu_count() or 1)
+    train_data, val_data = ChunkedDataset.split(paths, chunk_steps, val_fraction, seed=seed, batch_size=batch_size,
+                                                prefetch=prefetch, threads=threads)
+    model = make_model(train_data.obs_dim, train_data.action_dim, init, players_per_side, num_balls)
+    policy = model.policy
+    optimizer = torch.optim.Adam(policy.parameters(), lr=learning_rate)
+    wrap_angle = _has_angle(model.action_space)
+    print(f"Behaviour cloning on {len(train_data):,} steps ({len(val_data):,} held out) "
+          f"from {len(paths)} recording(s)")
+
+    for epoch in range(1, epochs + 1):
+        policy.set_training_mode(True)
+        start, samples, total = time.perf_counter(), 0, 0.0
+        train_data.wait_time = 0.0
+        for obs, actions in train_data:
+            loss = _loss(policy, obs, actions, ent_coef, wrap_angle)
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(policy.parameters(), model.max_grad_norm)  # Same clipping as PPO.train
+            optimizer.step()
+            samples += len(obs)
+            total += loss.item() * len(obs)
+        elapsed = time.perf_counter() - start
+
+        policy.set_training_mode(False)
+        val_loss, val_samples = 0.0, 0
+        with torch.no_grad():
+            for obs, actions in val_data:
+                val_loss += _loss(policy, obs, actions, 0.0, wrap_angle).item() * len(obs)
+                val_samples += len(obs)
+        val_text = f", val loss {val_loss / val_samples:.4f}" if val_samples else ""
+        print(f"Epoch {epoch}: loss {total / max(samples, 1):.4f}{val_text}, "
+              f"{samples / elapsed:,.0f} samples/s, waited on data {100 * train_data.wait_time / elapsed:.0f}%")
+
+    model.save(output)
+    print(f"Saved the cloned policy to {output}.zip")
+    return model
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="TrajectoryRecorder files")
+    parser.add_argument("--output", default="models/bc_policy", help="Where to save the PPO .zip")
+    parser.add_argument("--init", help="Start from this PPO checkpoint instead of a fresh MlpPolicy")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--learning-rate", type=float, default=LEARNING_RATE)
+    parser.add_argument("--chunk-steps", type=int, default=CHUNK_STEPS, help="Rows per shuffled chunk")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_CHUNKS, help="Chunks read ahead")
+    parser.add_argument("--threads", type=int, default=READ_THREADS, help="Background reader threads")
+    parser.add_argument("--players-per-side", type=int, default=1, help="Soccer Stars layout of the recordings")
+    parser.add_argument("--balls", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    train_offline(args.recordings, args.output, args.epochs, args.init, args.players_per_side, args.balls,
+                  args.batch_size, args.learning_rate, chunk_steps=args.chunk_steps, prefetch=args.prefetch,
+                  threads=args.threads)
@@ -1,26 +1,86 @@
-import gym
-from stable_baselines3 import PPO
+import argparse
+from functools import partial
 from env.soccer_stars_env import SoccerStarsEnv
 
-# Initialize the environment
-env = SoccerStarsEnv()
+# stable-baselines3 (and torch with it) is imported inside the functions below:
+# rollout workers re-import this script and should not pay for it
 
-# Train the agent using PPO
-model = PPO("MlpPolicy", env, verbose=1)
-model.learn(total_timesteps=100000)  # Train for 100k timesteps
+TOTAL_TIMESTEPS = 100000
+NUM_ENVS = 8
 
-# Save the model
-model.save("soccer_stars_ppo")
+def make_env(num_envs=NUM_ENVS, workers=1, reward_shaping=False, curriculum=False):
+    """Soccer Stars pitches in this process, or spread over worker processes with shared-memory rollouts."""
+    from env.shared_vec_env import SharedMemoryVecEnv
 
-from stable_baselines3 import PPO
+    env_fn = partial(SoccerStarsEnv, reward_shaping=reward_shaping, curriculum=curriculum)
+    # DummyVecEnv would need shimmy for the gym 0.26 envs; workers=0 keeps them in this process
+    return SharedMemoryVecEnv([env_fn] * num_envs, num_workers=workers if workers > 1 else 0)
 
-env = SoccerStarsEnv()
-model = PPO.load("soccer_stars_ppo", env=env)
+def train(num_envs=NUM_ENVS, workers=1, self_play=False, reward_shaping=False, curriculum=False):
+    from stable_baselines3 import PPO
 
-for episode in range(5):
-    obs = env.reset()
-    done = False
-    while not done:
-        action, _ = model.predict(obs)
-        obs, reward, done, _ = env.step(action)
-        env.render()  # Visualize each step
+    # Initialize the environment
+    env = make_env(num_envs, workers, reward_shaping, curriculum)
+    callbacks = []
+    if self_play:
+        # Player 2 is driven by past snapshots of the agent instead of standing still
+        from agents.self_play import OpponentPool, SelfPlayCallback, SelfPlayVecEnv
+        pool = OpponentPool()
+        env = SelfPlayVecEnv(env, pool, game="soccer_stars")
+        callbacks.append(SelfPlayCallback(pool, verbose=1))
+
+    # Train the agent using PPO
+    model = PPO("MlpPolicy", env, verbose=1)
+    model.learn(total_timesteps=TOTAL_TIMESTEPS, callback=callbacks)  # Train for 100k timesteps
+
+    # Save the model
+    model.save("soccer_stars_ppo")
+    env.close()
+
+def play(episodes=5, video_path=None, render_every=1):
+    """Watch the trained agent, or record it to video_path without a display."""
+    from agents.inference import NumpyPolicy
+
+    env = SoccerStarsEnv(render_every=render_every)
+    model = NumpyPolicy.load("soccer_stars_ppo.zip")  # Same actions as PPO.load(...).predict, without torch per step
+
+    writer = None
+    if video_path:
+        import cv2  # Only needed for recording
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), 60 / render_every, (env.WIDTH, env.HEIGHT))
+
+    last_frame = None
+    for episode in range(episodes):
+        obs = env.reset()
+        done = False
+        while not done:
+            action, _ = model.predict(obs, deterministic=False)
+            obs, reward, done, _ = env.step(action)
+            if writer is None:
+                env.render()  # Visualize each step
+                continue
+            frame = env.render(mode="rgb_array")
+            if frame is not last_frame:  # Skipped frames hand back the previous one
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+                last_frame = frame
+
+    if writer is not None:
+        writer.release()
+    env.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train a PPO agent on Soccer Stars, then watch it play.")
+    parser.add_argument("--num-envs", type=int, default=NUM_ENVS, help="Pitches collected per rollout step")
+    parser.add_argument("--workers", type=int, default=1, help="Rollout worker processes (1 = single process)")
+    parser.add_argument("--self-play", action="store_true", help="Train against a pool of the agent's past snapshots")
+    parser.add_argument("--reward-shaping", action="store_true", help="Add dense potential-based rewards to the goals")
+    parser.add_argument("--curriculum", action="store_true", help="Start episodes from practice scenarios that get harder")
+    parser.add_argument("--video", help="Record playback to this .mp4 file offscreen instead of opening a window")
+    parser.add_argument("--render-every", type=int, default=1, help="Draw only every k-th playback frame")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    train(num_envs=args.num_envs, workers=args.workers, self_play=args.self_play,
+          reward_shaping=args.reward_shaping, curriculum=args.curriculum)
+    play(video_path=args.video, render_every=args.render_every)